@@ -3,20 +3,46 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
+import hashlib
+import functools
+import time as clock
 import dateutil.parser
+import dateutil.rrule
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, g, has_request_context, stream_with_context, stream_template
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, or_
+from sqlalchemy import func, text, table, column, event, select, bindparam
+from sqlalchemy.dialects import postgresql
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
+from flask_wtf import FlaskForm as Form
 from forms import *
+from pagination import paginate, stream_page
+from search import search_page
+from phones import display_phone
+from choices import registry as choice_registry
+from fragments import FragmentCache, FragmentCacheExtension
+from cache import ResponseCache
+from jobs import JobQueue
+from profiler import RequestProfiler
+from dbpool import TimedQueuePool, pool_stats
+from routing import RoutingSession, replica_engines
+from importer import read_rows, chunks, validate_row, insert_ignoring_conflicts, ImportStats
+from booking import Bookings, free_slots
+from exporter import stream_batches, csv_chunks, jsonl_chunks, gzip_chunks, write_parquet
 import sys
-from datetime import date
+from datetime import date, datetime, time, timedelta
+from collections import Counter
+from itertools import groupby
+from itertools import islice
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -24,8 +50,12 @@ from datetime import date
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault('poolclass', TimedQueuePool)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
+cache = ResponseCache(app)
+jobs = JobQueue(app)
+profiler = RequestProfiler(app)
 
 # TODO: connect to a local postgresql database
 
@@ -36,7 +66,11 @@ show = db.Table('Show',
     db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), nullable=False),
     db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), nullable=False),
     db.Column('start_time', db.DateTime, nullable=False),
-    db.Column('id', db.Integer, primary_key=True)
+    db.Column('id', db.Integer, primary_key=True),
+    # detail pages and listings filter shows by venue/artist and start time
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time', 'start_time')
 )
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -52,9 +86,20 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable=False, default=True)
     seeking_description = db.Column(db.String())
     website = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    # postgres array, kept as a JSON list on sqlite
+    genres = db.Column(postgresql.ARRAY(db.String(120)).with_variant(db.JSON, 'sqlite'))
+    # row version for conditional requests, also bumped when its shows change
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # show counters kept by count_shows, past ones catch up with flask recount-shows
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     artists = db.relationship('Artist', secondary=show,
       backref=db.backref('venues', lazy=True))
+    # GIN index for genre containment filters, e.g. Venue.genres.contains(['Jazz'])
+    # and a trigram one (pg_trgm) for name ILIKE '%term%' searches
+    __table_args__ = (db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_Venue_state_city', 'state', 'city', 'id'),
+      db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}))
 
 
     def __reper__(self):
@@ -70,32 +115,640 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120), unique=True)
-    genres = db.Column(db.String(120))
+    genres = db.Column(postgresql.ARRAY(db.String(120)).with_variant(db.JSON, 'sqlite'))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=True)
     seeking_description = db.Column(db.String)
+    # row version for conditional requests, also bumped when its shows change
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    __table_args__ = (db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_Artist_state', 'state'),
+      db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}))
 
     def __reper__(self):
       return f'<id: {self.id}, description: {self.name}>'
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+class Choice(db.Model):
+    # options of the state and genre fields, read through choices.registry
+    __tablename__ = 'Choice'
+
+    kind = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(120), primary_key=True)
+    label = db.Column(db.String(120), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+datetime_formats = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  # parsing the pattern and loading the locale is most of babel's cost,
+  # do it once per format/locale instead of once per row
+  return babel.dates.parse_pattern(datetime_formats.get(format, format)), babel.Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # handlers pass datetimes, strings are still parsed for other callers
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['phone'] = display_phone
+
+# {% cache %} blocks of show cards and venue/artist details,
+# FRAGMENT_CACHE_ENABLED turns them off while templates are being edited
+app.jinja_env.add_extension(FragmentCacheExtension)
+if app.config['FRAGMENT_CACHE_ENABLED']:
+  app.jinja_env.fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+
+#----------------------------------------------------------------------------#
+# Sessions.
+#----------------------------------------------------------------------------#
+
+@app.before_request
+def route_reads():
+  # clients that wrote recently keep reading from the primary
+  # without replicas, and for static files, the session is not read: that
+  # would make the response vary on the cookie and keep shared caches out
+  if request.endpoint == 'static' or not replica_engines(db.engines):
+    return
+  g.primary_reads = session.get('primary_until', 0) > clock.time()
+
+@event.listens_for(db.session, 'after_commit')
+def remember_write(db_session):
+  if has_request_context():
+    g.wrote = True
+
+@app.after_request
+def stick_to_primary(response):
+  if g.get('wrote') and replica_engines(db.engines):
+    session['primary_until'] = clock.time() + app.config['REPLICA_STICKY_SECONDS']
+  return response
+
+@app.teardown_request
+def release_session(exception=None):
+  # every request, read or write, hands its connection back to the pool here
+  # an unfinished transaction (e.g. after an error) is rolled back
+  db.session.remove()
+
+@app.route('/__pool')
+def pool_status():
+  return jsonify({key or 'primary': pool_stats(engine) for key, engine in db.engines.items()})
+
+@app.route('/__metrics')
+def metrics():
+  # request, SQL and template timings of the profiled requests, see profiler.py
+  return Response(profiler.render(), mimetype='text/plain; version=0.0.4')
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+def page_args():
+  # cursors and page size come from the query string or the posted search form
+  per_page = request.values.get('per_page', app.config['PAGE_SIZE'], type=int)
+  return {'after': request.values.get('after'),
+    'before': request.values.get('before'),
+    'per_page': max(1, min(per_page, app.config['MAX_PAGE_SIZE']))}
+
+def listing_page(query, keys, item, stream=False):
+  # a page of item(row) dicts; streamed pages read their rows from a
+  # server-side cursor while the template renders, backward pages are
+  # fetched in reverse and so are always buffered
+  args = page_args()
+  if stream and not args['before']:
+    return stream_page(db.session, query, keys, args['after'], args['per_page'], item)
+  page = paginate(query, keys, **args)
+  page.items = [item(row) for row in page.items]
+  return page
+
+def render_listing(template, **context):
+  # send the page while it renders, unless a flashed message is pending:
+  # the layout pops it from the session, whose cookie a streamed response
+  # has already sent
+  if session.get('_flashes'):
+    return render_template(template, **context)
+  return Response(stream_template(template, **context), mimetype='text/html')
+
+def with_count():
+  # totals are only counted for the first page of a search, if enabled
+  return app.config['SEARCH_COUNTS'] and not (request.values.get('after') or request.values.get('before'))
+
+def listing_url(**changes):
+  # the current listing with its filters, minus the cursors, plus changes
+  # a change set to None removes that argument
+  args = request.args.to_dict()
+  args.pop('after', None)
+  args.pop('before', None)
+  args.update(changes)
+  return url_for(request.endpoint, **{k: v for k, v in args.items() if v is not None})
+
+app.jinja_env.globals['listing_url'] = listing_url
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+# facet counts (facet, value, count) are materialized views on postgres,
+# see migration 6a0e5d93b1c4, and are refreshed after venue/artist writes
+facet_views = {
+  'Venue': table('venue_facet_counts', column('facet'), column('value'), column('count')),
+  'Artist': table('artist_facet_counts', column('facet'), column('value'), column('count')),
+}
+
+def facet_filters(model, seeking):
+  # ?genre=Jazz&state=NY&seeking=1 narrow down a listing
+  # several genre arguments must all match
+  filters = []
+  genres = request.args.getlist('genre')
+  if genres:
+    filters.append(genre_filter(model, genres))
+  if request.args.get('state'):
+    filters.append(model.state == request.args['state'])
+  if request.args.get('seeking') in ('0', '1'):
+    filters.append(seeking == (request.args['seeking'] == '1'))
+  return filters
+
+def genre_filter(model, genres):
+  # postgres tests array containment (@>) on the GIN index,
+  # sqlite looks each genre up in the JSON list
+  if db.session.get_bind().dialect.name == 'postgresql':
+    return model.genres.contains(genres)
+  conditions = []
+  for genre in genres:
+    values = func.json_each(model.genres).table_valued('value')
+    conditions.append(select(values.c.value).where(values.c.value == genre).exists())
+  return db.and_(*conditions)
+
+def facet_counts(model, seeking):
+  # {'genre': [(value, count), ...], 'state': [...], 'seeking': [...]}
+  facets = {'genre': [], 'state': [], 'seeking': []}
+  if db.session.get_bind().dialect.name == 'postgresql':
+    view = facet_views[model.__tablename__]
+    rows = db.session.query(view.c.facet, view.c.value, view.c.count)\
+      .order_by(view.c.facet, view.c.count.desc(), view.c.value)
+    for row in rows:
+      facets[row.facet].append((row.value, row.count))
+    return facets
+  # other databases have no materialized views, aggregate on the fly
+  genres = Counter(genre for row in db.session.query(model.genres) for genre in row.genres or [])
+  facets['genre'] = sorted(genres.items(), key=lambda item: (-item[1], item[0]))
+  facets['state'] = db.session.query(model.state, func.count(model.id))\
+    .filter(model.state != None)\
+    .group_by(model.state)\
+    .order_by(func.count(model.id).desc(), model.state).all()
+  facets['seeking'] = [('1' if value else '0', count) for value, count in db.session\
+    .query(seeking, func.count(model.id)).group_by(seeking).order_by(func.count(model.id).desc()).all()]
+  return facets
+
+def refresh_facets(model):
+  # recompute the facet counts once a venue/artist change is committed
+  if db.session.get_bind().dialect.name == 'postgresql':
+    db.session.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY ' + facet_views[model.__tablename__].name))
+    db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+def venue_tags(venue_id):
+  # cached pages showing a venue: listings, its page, and its artists' pages
+  artist_ids = db.session.query(show.c.artist_id).filter(show.c.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:%s' % venue_id] + ['artist:%s' % row.artist_id for row in artist_ids]
+
+def artist_tags(artist_id):
+  # cached pages showing an artist: listings, its page, and its venues' pages
+  venue_ids = db.session.query(show.c.venue_id).filter(show.c.artist_id == artist_id).distinct()
+  return ['artists', 'shows', 'artist:%s' % artist_id] + ['venue:%s' % row.venue_id for row in venue_ids]
+
+@app.route('/__cache')
+def cache_stats():
+  stats = cache.stats()
+  if app.jinja_env.fragment_cache is not None:
+    stats['fragments'] = app.jinja_env.fragment_cache.stats()
+  return jsonify(stats)
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+# work a write can leave for after its response, run by the jobs workers
+# cache invalidation stays in the request so a redirect never shows stale pages
+
+@jobs.task
+def refresh_facet_views(tablename):
+  refresh_facets(Venue if tablename == 'Venue' else Artist)
+  # listings cached while the view was refreshing carry the old counts
+  cache.invalidate('venues' if tablename == 'Venue' else 'artists')
+
+def schedule_facet_refresh(tablename):
+  # the refresh rereads the whole table, writes within FACETS_REFRESH_DELAY
+  # seconds share one run
+  jobs.enqueue('refresh_facet_views', tablename, delay=app.config['FACETS_REFRESH_DELAY'], unique=True)
+
+@jobs.task
+def recount_show_counters(tablename, ids):
+  recount_shows(Venue if tablename == 'Venue' else Artist, ids)
+  db.session.commit()
+
+@app.route('/__jobs')
+def job_stats():
+  return jsonify(jobs.stats())
+
+@app.route('/__jobs/<int:job_id>')
+def job_status(job_id):
+  job = jobs.store.get(job_id) if jobs.store is not None else None
+  if job is None:
+    abort(404)
+  # status only, arguments and tracebacks stay in the queue and the log
+  return jsonify({key: value for key, value in job.items() if key not in ('args', 'error')})
+
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+def touch(model, ids):
+  # bump updated_at of rows whose pages show data that just changed
+  model.query.filter(model.id.in_(ids))\
+    .update({model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+def conditional(model, arg):
+  # ETag from the row version, a matching If-None-Match answers 304
+  # before the page is queried or rendered
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+      if session.get('_flashes'):
+        return view(**kwargs)
+      updated_at = db.session.query(model.updated_at).filter(model.id == kwargs[arg]).scalar()
+      if updated_at is None:
+        return view(**kwargs)
+      # shows move from upcoming to past daily, so the day is part of the version
+      etag = hashlib.sha1(('%s:%s:%s:%s' % (model.__tablename__, kwargs[arg],
+        updated_at.isoformat(), date.today())).encode()).hexdigest()
+      if etag in request.if_none_match:
+        response = app.response_class(status=304)
+      else:
+        response = app.make_response(view(**kwargs))
+      if response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+static_hashes = {}
+
+def static_url(filename):
+  # static urls carry a hash of the file, so they can be cached for good
+  if app.debug or filename not in static_hashes:
+    try:
+      with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        static_hashes[filename] = hashlib.md5(f.read()).hexdigest()[:12]
+    except OSError:
+      static_hashes[filename] = None
+  return url_for('static', filename=filename, v=static_hashes[filename])
+
+app.jinja_env.globals['static_url'] = static_url
+
+@app.after_request
+def static_cache_control(response):
+  if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+  return response
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# upcoming and past show counts are stored on Venue and Artist so listings
+# read a column instead of counting shows per row; writes adjust them and a
+# daily recount moves the shows that have started since into the past
+
+def count_shows(model, rows, sign=1):
+  # add the shows (sign=-1: take them off) to the counters of their venues or
+  # artists, one statement run for every row touched; updated_at moves too
+  key = 'venue_id' if model is Venue else 'artist_id'
+  today = datetime.combine(date.today(), time())
+  deltas = {}
+  for values in rows:
+    upcoming, past = deltas.get(values[key], (0, 0))
+    if values['start_time'] >= today:
+      deltas[values[key]] = (upcoming + sign, past)
+    else:
+      deltas[values[key]] = (upcoming, past + sign)
+  if not deltas:
+    return
+  table = model.__table__
+  db.session.execute(table.update()\
+    .where(table.c.id == bindparam('row_id'))\
+    .values(upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming'),
+      past_shows_count=table.c.past_shows_count + bindparam('past')),
+    [{'row_id': row_id, 'upcoming': upcoming, 'past': past}
+      for row_id, (upcoming, past) in deltas.items()])
+
+def recount_shows(model, ids=None):
+  # set the counters from the Show table, for these ids or every row
+  key = show.c.venue_id if model is Venue else show.c.artist_id
+  today = datetime.combine(date.today(), time())
+  upcoming = select(func.count(show.c.id))\
+    .where(key == model.id, show.c.start_time >= today).scalar_subquery()
+  past = select(func.count(show.c.id))\
+    .where(key == model.id, show.c.start_time < today).scalar_subquery()
+  statement = model.__table__.update()\
+    .values(upcoming_shows_count=upcoming, past_shows_count=past)
+  if ids is not None:
+    statement = statement.where(model.id.in_(ids))
+  db.session.execute(statement)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# shared by the pages and the JSON API
+# listings and searches return a Page of dicts, details a dict or None
+
+def venue_listing(stream=False):
+  venues = db.session\
+    .query(Venue.id, Venue.name, Venue.city, Venue.state,
+      Venue.upcoming_shows_count.label('num_upcoming_shows'))\
+    .filter(*facet_filters(Venue, Venue.seeking_talent))
+  # pages are ordered by state/city so places stay together
+  return listing_page(venues, [Venue.state, Venue.city, Venue.id],
+    lambda venue: {'id': venue.id, 'name': venue.name, 'city': venue.city, 'state': venue.state,
+      'num_upcoming_shows': venue.num_upcoming_shows}, stream)
+
+def venue_search(search_term):
+  # rows and total come from one ranked query
+  venues = db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count.label('num_upcoming_shows'))
+  page = search_page(db.session, venues, [Venue.name], search_term,
+    ['name', 'id'], with_total=with_count(), **page_args())
+  page.items = [{
+      "id": venue.id,
+      "name": venue.name,
+      "num_upcoming_shows": venue.num_upcoming_shows
+    } for venue in page.items]
+  return page
+
+def venue_details(venue_id):
+  # one query returns the venue with all its shows (or a single row without any)
+  rows = db.session\
+    .query(Venue, Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'), Artist.updated_at.label('artist_updated_at'),
+      show.c.id.label('show_id'), show.c.start_time)\
+    .outerjoin(show, show.c.venue_id == Venue.id)\
+    .outerjoin(Artist, Artist.id == show.c.artist_id)\
+    .filter(Venue.id == venue_id)\
+    .order_by(show.c.start_time)\
+    .all()
+  if not rows:
+    return None
+  venue = rows[0].Venue
+  # split the shows into past and upcoming, counts are the list lengths
+  today = datetime.combine(date.today(), time())
+  upcoming_shows_dict = []
+  past_shows_dict = []
+  for row in rows:
+    if row.start_time is None:
+      continue
+    show_dict = {
+      "id": row.show_id,
+      "artist_id": row.artist_id,
+      "artist_name": row.artist_name,
+      "artist_image_link": row.artist_image_link,
+      "start_time": row.start_time,
+      "updated_at": row.artist_updated_at
+    }
+    if row.start_time >= today:
+      upcoming_shows_dict.append(show_dict)
+    else:
+      past_shows_dict.append(show_dict)
+  return {
+    "id": venue.id,
+    "name": venue.name,
+    "updated_at": venue.updated_at,
+    "genres": venue.genres or [],
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "address": venue.address,
+    "website": venue.website,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "facebook_link": venue.facebook_link,
+    "image_link": venue.image_link,
+    "past_shows": past_shows_dict,
+    "upcoming_shows": upcoming_shows_dict,
+    "past_shows_count": len(past_shows_dict),
+    "upcoming_shows_count": len(upcoming_shows_dict),
+  }
+
+def artist_listing():
+  artists = Artist.query.with_entities(Artist.id, Artist.name)\
+    .filter(*facet_filters(Artist, Artist.seeking_venue))
+  page = paginate(artists, [Artist.name, Artist.id], **page_args())
+  page.items = [{'id': artist.id, 'name': artist.name} for artist in page.items]
+  return page
+
+def artist_search(search_term):
+  # rows and total come from one ranked query
+  artists = db.session.query(Artist.id, Artist.name, Artist.upcoming_shows_count.label('num_upcoming_shows'))
+  page = search_page(db.session, artists, [Artist.name], search_term,
+    ['name', 'id'], with_total=with_count(), **page_args())
+  page.items = [{
+      "id": artist.id,
+      "name": artist.name,
+      "num_upcoming_shows": artist.num_upcoming_shows
+    } for artist in page.items]
+  return page
+
+def artist_details(artist_id):
+  # one query returns the artist with all its shows (or a single row without any)
+  rows = db.session\
+    .query(Artist, Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link'), Venue.updated_at.label('venue_updated_at'),
+      show.c.id.label('show_id'), show.c.start_time)\
+    .outerjoin(show, show.c.artist_id == Artist.id)\
+    .outerjoin(Venue, Venue.id == show.c.venue_id)\
+    .filter(Artist.id == artist_id)\
+    .order_by(show.c.start_time)\
+    .all()
+  if not rows:
+    return None
+  artist = rows[0].Artist
+  # split the shows into past and upcoming, counts are the list lengths
+  today = datetime.combine(date.today(), time())
+  upcoming_shows_dict = []
+  past_shows_dict = []
+  for row in rows:
+    if row.start_time is None:
+      continue
+    show_dict = {
+      "id": row.show_id,
+      "venue_id": row.venue_id,
+      "venue_name": row.venue_name,
+      "venue_image_link": row.venue_image_link,
+      "start_time": row.start_time,
+      "updated_at": row.venue_updated_at
+    }
+    if row.start_time >= today:
+      upcoming_shows_dict.append(show_dict)
+    else:
+      past_shows_dict.append(show_dict)
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "updated_at": artist.updated_at,
+    "genres": artist.genres or [],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "facebook_link": artist.facebook_link,
+    "image_link": artist.image_link,
+    "past_shows": past_shows_dict,
+    "upcoming_shows": upcoming_shows_dict,
+    "past_shows_count": len(past_shows_dict),
+    "upcoming_shows_count": len(upcoming_shows_dict),
+  }
+
+def show_listing(stream=False):
+  # upcoming shows ordered by start time, a range scan of ix_Show_start_time
+  # venue and artist columns come from one join over Show,
+  # num_shows (upcoming shows of the same venue) is the venue's counter
+  upcoming_shows = db.session\
+    .query(show.c.id, show.c.venue_id, Venue.name.label('venue_name'), Venue.updated_at.label('venue_updated_at'),
+      show.c.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+      Artist.updated_at.label('artist_updated_at'), show.c.start_time,
+      Venue.upcoming_shows_count.label('num_shows'))\
+    .join(Venue, Venue.id == show.c.venue_id)\
+    .join(Artist, Artist.id == show.c.artist_id)\
+    .filter(show.c.start_time >= date.today())
+  # updated_at is the newer of the venue and artist versions, it changes with anything the row shows
+  return listing_page(upcoming_shows, [show.c.start_time, show.c.id],
+    lambda current_show: {'id': current_show.id
+    , 'venue_id': current_show.venue_id
+    , 'venue_name': current_show.venue_name
+    , 'artist_id': current_show.artist_id
+    , 'artist_name': current_show.artist_name
+    , 'artist_image_link': current_show.artist_image_link
+    , 'start_time': current_show.start_time
+    , 'updated_at': max(current_show.venue_updated_at, current_show.artist_updated_at)
+    , 'num_shows': current_show.num_shows}, stream)
+
+def show_search(search_term):
+  # shows whose venue or artist matches search_term, best matches first
+  shows = db.session.query(Artist.id.label('artist_id'), Artist.name.label('artist_name'), Artist.image_link, Venue.id.label('venue_id'), Venue.name.label('venue_name'), show.c.start_time, show.c.id,
+      Venue.updated_at.label('venue_updated_at'), Artist.updated_at.label('artist_updated_at'))\
+    .join(show, Venue.id == show.c.venue_id)\
+    .filter(show.c.artist_id == Artist.id)
+  page = search_page(db.session, shows, [Venue.name, Artist.name], search_term,
+    ['start_time', 'id'], with_total=with_count(), **page_args())
+  page.items = [{'id': current_show.id
+    , 'venue_id': current_show.venue_id
+    , 'venue_name': current_show.venue_name
+    , 'artist_id': current_show.artist_id
+    , 'artist_name': current_show.artist_name
+    , 'artist_image_link': current_show.image_link
+    , 'start_time': current_show.start_time
+    , 'updated_at': max(current_show.venue_updated_at, current_show.artist_updated_at)
+    } for current_show in page.items]
+  return page
+
+def show_details(show_id):
+  # the show with its venue and artist names, None when it does not exist
+  current_show = db.session.query(show.c.id, show.c.venue_id, Venue.name.label('venue_name'),
+      Venue.updated_at.label('venue_updated_at'), show.c.artist_id, Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'), Artist.updated_at.label('artist_updated_at'), show.c.start_time)\
+    .join(Venue, Venue.id == show.c.venue_id)\
+    .join(Artist, Artist.id == show.c.artist_id)\
+    .filter(show.c.id == show_id)\
+    .first()
+  if current_show is None:
+    return None
+  return {'id': current_show.id
+    , 'venue_id': current_show.venue_id
+    , 'venue_name': current_show.venue_name
+    , 'artist_id': current_show.artist_id
+    , 'artist_name': current_show.artist_name
+    , 'artist_image_link': current_show.artist_image_link
+    , 'start_time': current_show.start_time
+    , 'updated_at': max(current_show.venue_updated_at, current_show.artist_updated_at)}
+
+def check_show_references(rows):
+  # keep shows whose venue and artist exist, one lookup per table and chunk
+  # rows are (line, values), returns (valid rows, [(line, error)])
+  valid, rejects = [], []
+  for line, values in rows:
+    try:
+      values['venue_id'], values['artist_id'] = int(values['venue_id']), int(values['artist_id'])
+      valid.append((line, values))
+    except (TypeError, ValueError):
+      rejects.append((line, 'venue_id and artist_id must be numbers'))
+  venue_ids = {row.id for row in db.session.query(Venue.id)\
+    .filter(Venue.id.in_({values['venue_id'] for line, values in valid}))}
+  artist_ids = {row.id for row in db.session.query(Artist.id)\
+    .filter(Artist.id.in_({values['artist_id'] for line, values in valid}))}
+  rejects += [(line, 'unknown venue or artist') for line, values in valid
+    if values['venue_id'] not in venue_ids or values['artist_id'] not in artist_ids]
+  valid = [(line, values) for line, values in valid
+    if values['venue_id'] in venue_ids and values['artist_id'] in artist_ids]
+  return valid, rejects
+
+def show_duration():
+  return timedelta(minutes=app.config['SHOW_DURATION_MINUTES'])
+
+def booked_shows(column, ids, start, end):
+  # (id, start_time) of the shows of these venues or artists starting between
+  # start and end, a range scan of ix_Show_venue_id_start_time or ix_Show_artist_id_start_time
+  return db.session.query(column, show.c.start_time)\
+    .filter(column.in_(ids), show.c.start_time > start, show.c.start_time < end).all()
+
+def check_show_conflicts(rows):
+  # keep shows that double-book neither their venue nor their artist, checked
+  # against the booked shows and the earlier rows; rows are (line, values) with
+  # existing references, returns (valid rows, [(line, error)])
+  if not rows:
+    return rows, []
+  duration = show_duration()
+  starts = [values['start_time'] for line, values in rows]
+  start, end = min(starts) - duration, max(starts) + duration
+  venue_ids = sorted({values['venue_id'] for line, values in rows})
+  artist_ids = sorted({values['artist_id'] for line, values in rows})
+  # concurrent bookings of the same venue or artist wait here until this transaction ends
+  db.session.query(Venue.id).filter(Venue.id.in_(venue_ids)).order_by(Venue.id).with_for_update().all()
+  db.session.query(Artist.id).filter(Artist.id.in_(artist_ids)).order_by(Artist.id).with_for_update().all()
+  venues, artists = Bookings(duration), Bookings(duration)
+  for venue_id, start_time in booked_shows(show.c.venue_id, venue_ids, start, end):
+    venues.add(venue_id, start_time)
+  for artist_id, start_time in booked_shows(show.c.artist_id, artist_ids, start, end):
+    artists.add(artist_id, start_time)
+  valid, rejects = [], []
+  for line, values in rows:
+    if venues.clashes(values['venue_id'], values['start_time']):
+      rejects.append((line, 'venue is booked at that time'))
+    elif artists.clashes(values['artist_id'], values['start_time']):
+      rejects.append((line, 'artist is booked at that time'))
+    else:
+      venues.add(values['venue_id'], values['start_time'])
+      artists.add(values['artist_id'], values['start_time'])
+      valid.append((line, values))
+  return valid, rejects
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -110,121 +763,32 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cache.cached('venues')
 def venues():
-  data = []
-  # get already inserted state/city in Venue
-  places = Venue.query.with_entities(Venue.city, Venue.state).distinct().all()
-  # loop to get each venue according to state/city
-  # get num of upcoming shows is calculated for each revenue
-  for place in places:
-    num = db.session.query(func.count(show.c.id))\
-      .filter(show.c.venue_id == Venue.id)\
-      .filter(show.c.start_time >= date.today())\
-      .label('num_upcoming_shows') 
-    venues = db.session\
-      .query(Venue.id, Venue.name, num)\
-      .filter(Venue.state == place.state)\
-      .filter(Venue.city == place.city)\
-      .all()
-    # build venues
-    values=[]
-    for venue in venues:
-      values.append({'id': venue.id, 'name': venue.name, 'num_upcoming_shows': venue.num_upcoming_shows})
-
-    # build final returned data using venues
-    data.append({'city' : place.city, 'state' : place.state, "venues" : values})
-  return render_template('pages/venues.html', areas=data)
+  page = venue_listing(stream=True)
+  # venues are ordered by state/city, so each place is one run of the page
+  areas = ({'state': state, 'city': city, 'venues': venues}
+    for (state, city), venues in groupby(page, lambda venue: (venue['state'], venue['city'])))
+  return render_listing('pages/venues.html', areas=areas, page=page,
+    facets=facet_counts(Venue, Venue.seeking_talent))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   # using search term, search the venues in incase-sesitive
-
-  # get venues count according to search
-  venues_count = db.session.query(Venue.id)\
-    .filter(Venue.name.ilike('%' + request.form.get('search_term') +'%')).count()
-  # build venue row
-  num = db.session.query(func.count(show.c.id))\
-      .filter(show.c.venue_id == Venue.id)\
-      .filter(show.c.start_time >= date.today())\
-      .label('num_upcoming_shows')
-  venues = db.session\
-    .query(Venue.id, Venue.name, num)\
-    .filter(Venue.name.ilike('%' + request.form.get('search_term') +'%'))\
-    .all()
-  venues_dict = []
-  for venue in venues:
-    venues_dict.append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": venue.num_upcoming_shows
-    })
-  response = {"count" : venues_count, "data" : venues_dict}
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  page = venue_search(request.form.get('search_term', ''))
+  response = {"count" : page.count, "data" : page.items}
+  return render_template('pages/search_venues.html', results=response, page=page, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
+@conditional(Venue, 'venue_id')
 def show_venue(venue_id):
   # check if venue is existing, return its rows 
   # else redirect to home page with error message
   error = False
   try:
-    venue = Venue.query.get(venue_id)
-    upcoming_shows = db.session.query(Artist, db.cast(show.c.start_time, db.String).label('start_time'))\
-      .join(show)\
-      .filter(show.c.venue_id == venue_id)\
-      .filter(show.c.start_time >= date.today())\
-      .group_by(Artist.id).group_by(show.c.start_time)\
-      .all()
-    upcoming_shows_count = db.session.query(Artist)\
-      .join(show)\
-      .filter(show.c.venue_id == venue_id)\
-      .filter(show.c.start_time >= date.today())\
-      .count()
-    past_shows = db.session.query(Artist, db.cast(show.c.start_time, db.String).label('start_time'))\
-      .join(show)\
-      .filter(show.c.venue_id == venue_id)\
-      .filter(show.c.start_time < date.today())\
-      .group_by(Artist.id).group_by(show.c.start_time)\
-      .all()
-    past_shows_count = db.session.query(Artist)\
-      .join(show)\
-      .filter(show.c.venue_id == venue_id)\
-      .filter(show.c.start_time < date.today())\
-      .count()
-    upcoming_shows_dict = []
-    for artist in upcoming_shows:
-        upcoming_shows_dict.append({
-        "artist_id": artist.Artist.id,
-        "artist_name": artist.Artist.name,
-        "artist_image_link": artist.Artist.image_link,
-        "start_time": artist.start_time
-      })
-    past_shows_dict = []
-    for artist in past_shows:
-        past_shows_dict.append({
-        "artist_id": artist.Artist.id,
-        "artist_name": artist.Artist.name,
-        "artist_image_link": artist.Artist.image_link,
-        "start_time": artist.start_time
-      })
-    # build final returned data
-    data = {
-      "id": venue.id,
-      "name": venue.name,
-      "genres": venue.genres.replace('{','').replace('}','').replace('"','').split(','),
-      "city": venue.city,
-      "state": venue.state,
-      "phone": venue.phone,
-      "address": venue.address,
-      "website": venue.website,
-      "seeking_talent": venue.seeking_talent,
-      "seeking_description": venue.seeking_description,
-      "facebook_link": venue.facebook_link,
-      "image_link": venue.image_link,
-      "past_shows": past_shows_dict,
-      "upcoming_shows": upcoming_shows_dict,
-      "past_shows_count": past_shows_count,
-      "upcoming_shows_count": upcoming_shows_count,
-    }
+    data = venue_details(venue_id)
+    error = data is None
   except:
     error = True
     print(sys.exc_info())
@@ -257,7 +821,7 @@ def create_venue_submission():
           venue = Venue(name=request.form['name'], 
           city=request.form['city'], 
           state=request.form['state'],
-          phone=request.form['phone'], 
+          phone=form.phone.data, 
           address=request.form['address'], 
           genres=request.form.getlist('genres'),
           facebook_link=request.form['facebook_link'], 
@@ -267,6 +831,8 @@ def create_venue_submission():
           seeking_description=request.form['seeking_description'])
           db.session.add(venue)
           db.session.commit()
+          schedule_facet_refresh('Venue')
+          cache.invalidate('venues')
       else:
           return render_template('forms/new_venue.html', form=form)
   except SQLAlchemyError as e:
@@ -276,8 +842,6 @@ def create_venue_submission():
       error = True
       print(sys.exc_info())
       db.session.rollback()
-  finally:
-      db.session.close()
   if error:
       # on unsuccessful db insert, flash an error instead.
       flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
@@ -296,14 +860,25 @@ def delete_venue(venue_id):
   error = False
   try:
     venue = Venue.query.get(venue_id)
+    tags = venue_tags(venue.id)
+    # its shows go with it, the artists who played there lose them from their counts
+    # (deleted here by id, the artists relationship would delete them by
+    # venue/artist pair and fail when a pair has several shows)
+    artist_ids = [row.artist_id for row in db.session.query(show.c.artist_id)\
+      .filter(show.c.venue_id == venue.id).distinct()]
+    db.session.execute(show.delete().where(show.c.venue_id == venue.id))
+    # their pages drop the shows now, so their versions change with this
+    # commit; only the counters are left to the job
+    touch(Artist, artist_ids)
     db.session.delete(venue)
     db.session.commit()
+    jobs.enqueue('recount_show_counters', 'Artist', artist_ids)
+    schedule_facet_refresh('Venue')
+    cache.invalidate(*tags)
   except:
     error = True
     print(sys.exc_info())
     db.session.rollback()
-  finally:
-    db.session.close()
   if error:
     flash('An error occurred. Venue cannot be deleted.')
     abort(500)
@@ -314,99 +889,30 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cache.cached('artists')
 def artists():
-  data = Artist.query.with_entities(Artist.id, Artist.name).order_by('id').all()
-  return render_template('pages/artists.html', artists=data)
+  data = artist_listing()
+  return render_template('pages/artists.html', artists=data, page=data,
+    facets=facet_counts(Artist, Artist.seeking_venue))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   # search artists with incase-sensitive 
   # search_term is used from form
-  
-  # get num of artists based on search criteria
-  artists_count = db.session.query(Artist.id)\
-    .filter(Artist.name.ilike('%' + request.form.get('search_term') +'%')).count()
-  # do search for the artists
-  num = db.session.query(func.count(show.c.id))\
-    .filter(show.c.artist_id == Artist.id)\
-    .filter(show.c.start_time >= date.today())\
-    .label('num_upcoming_shows')
-  artists = db.session\
-    .query(Artist.id, Artist.name, num)\
-    .filter(Artist.name.ilike('%' + request.form.get('search_term') +'%'))\
-    .all()
-  artists_dict = []
-  for artist in artists:
-    artists_dict.append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": artist.num_upcoming_shows
-    })
-  response = {"count" : artists_count, "data" : artists_dict}
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  page = artist_search(request.form.get('search_term', ''))
+  response = {"count" : page.count, "data" : page.items}
+  return render_template('pages/search_artists.html', results=response, page=page, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
+@conditional(Artist, 'artist_id')
 def show_artist(artist_id):
   # check for the artist and in case of fail, 
   # return an error message and redirect the user to Artists page
   error = False
   try:
-    artist = Artist.query.get(artist_id)
-    upcoming_shows = db.session.query(Venue, db.cast(show.c.start_time, db.String).label('start_time'))\
-      .join(show)\
-      .filter(show.c.artist_id == artist_id)\
-      .filter(show.c.start_time >= date.today())\
-      .group_by(Venue.id).group_by(show.c.start_time)\
-      .all()
-    upcoming_shows_count = db.session.query(Venue)\
-      .join(show)\
-      .filter(show.c.artist_id == artist_id)\
-      .filter(show.c.start_time >= date.today())\
-      .count()
-    past_shows = db.session.query(Venue, db.cast(show.c.start_time, db.String).label('start_time'))\
-      .join(show)\
-      .filter(show.c.artist_id == artist_id)\
-      .filter(show.c.start_time < date.today())\
-      .group_by(Venue.id).group_by(show.c.start_time)\
-      .all()
-    past_shows_count = db.session.query(Venue)\
-      .join(show)\
-      .filter(show.c.artist_id == artist_id)\
-      .filter(show.c.start_time < date.today())\
-      .count()
-    upcoming_shows_dict = []
-    for venue in upcoming_shows:
-        upcoming_shows_dict.append({
-        "venue_id": venue.Venue.id,
-        "venue_name": venue.Venue.name,
-        "venue_image_link": venue.Venue.image_link,
-        "start_time": venue.start_time
-      })
-    past_shows_dict = []
-    for venue in past_shows:
-        past_shows_dict.append({
-        "venue_id": venue.Venue.id,
-        "venue_name": venue.Venue.name,
-        "venue_image_link": venue.Venue.image_link,
-        "start_time": venue.start_time
-      })
-    # build returned data
-    data = {
-      "id": artist.id,
-      "name": artist.name,
-      "genres": artist.genres.replace('{','').replace('}','').replace('"','').split(','),
-      "city": artist.city,
-      "state": artist.state,
-      "phone": artist.phone,
-      "seeking_venue": artist.seeking_venue,
-      "seeking_description": artist.seeking_description,
-      "facebook_link": artist.facebook_link,
-      "image_link": artist.image_link,
-      "past_shows": past_shows_dict,
-      "upcoming_shows": upcoming_shows_dict,
-      "past_shows_count": past_shows_count,
-      "upcoming_shows_count": upcoming_shows_count,
-    }
+    data = artist_details(artist_id)
+    error = data is None
   except:
     error = True
     print(sys.exc_info())
@@ -425,7 +931,7 @@ def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
     # be sure to send the state/genres for the form to be built correctly
     form = ArtistForm(state=artist.state
-    , genres=artist.genres.replace('{','').replace('}','').replace('"','').split(','))
+    , genres=artist.genres)
   except:
       error = True
       print(sys.exc_info())
@@ -453,13 +959,17 @@ def edit_artist_submission(artist_id):
           artist.name=request.form['name'] 
           artist.city=request.form['city']
           artist.state=request.form['state']
-          artist.phone=request.form['phone']
+          artist.phone=form.phone.data
           artist.genres=request.form.getlist('genres') 
           artist.facebook_link=request.form['facebook_link']
           artist.image_link=request.form['image_link'] 
           artist.seeking_venue=seeking_venue
           artist.seeking_description=request.form['seeking_description']
+          # venue pages list this artist
+          touch(Venue, db.session.query(show.c.venue_id).filter(show.c.artist_id == artist_id))
           db.session.commit()
+          schedule_facet_refresh('Artist')
+          cache.invalidate(*artist_tags(artist_id))
       else:
           return render_template('forms/edit_artist.html', form=form)
   except SQLAlchemyError as e:
@@ -469,8 +979,6 @@ def edit_artist_submission(artist_id):
       error = True
       print(sys.exc_info())
       db.session.rollback()
-  finally:
-      db.session.close()
   if error:
       # on unsuccessful db update, flash an error instead.
       flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
@@ -487,7 +995,7 @@ def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
     # send state and genres to the form to load data
     form = VenueForm(state=venue.state
-    , genres=venue.genres.replace('{','').replace('}','').replace('"','').split(','))
+    , genres=venue.genres)
   except:
     error = True
     print(sys.exc_info())
@@ -514,7 +1022,7 @@ def edit_venue_submission(venue_id):
           venue.name=request.form['name'] 
           venue.city=request.form['city']
           venue.state=request.form['state']
-          venue.phone=request.form['phone']
+          venue.phone=form.phone.data
           venue.address=request.form['address'] 
           venue.genres=request.form.getlist('genres') 
           venue.facebook_link=request.form['facebook_link']
@@ -522,7 +1030,11 @@ def edit_venue_submission(venue_id):
           venue.website=request.form['website'] 
           venue.seeking_talent=seeking_talent
           venue.seeking_description=request.form['seeking_description']
+          # artist pages list this venue
+          touch(Artist, db.session.query(show.c.artist_id).filter(show.c.venue_id == venue_id))
           db.session.commit()
+          schedule_facet_refresh('Venue')
+          cache.invalidate(*venue_tags(venue_id))
       else:
           return render_template('forms/edit_venue.html', form=form)
   except SQLAlchemyError as e:
@@ -532,8 +1044,6 @@ def edit_venue_submission(venue_id):
       error = True
       print(sys.exc_info())
       db.session.rollback()
-  finally:
-      db.session.close()
   if error:
       # on unsuccessful db update, flash an error instead.
       flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.')
@@ -566,7 +1076,7 @@ def create_artist_submission():
           artist = Artist(name=request.form['name'], 
           city=request.form['city'], 
           state=request.form['state'],
-          phone=request.form['phone'], 
+          phone=form.phone.data, 
           genres=request.form.getlist('genres'), 
           facebook_link=request.form['facebook_link'], 
           image_link=request.form['image_link'], 
@@ -574,6 +1084,8 @@ def create_artist_submission():
           seeking_description=request.form['seeking_description'])
           db.session.add(artist)
           db.session.commit()
+          schedule_facet_refresh('Artist')
+          cache.invalidate('artists')
       else:
           return render_template('forms/new_artist.html', form=form)
   except SQLAlchemyError as e:
@@ -583,8 +1095,6 @@ def create_artist_submission():
       error = True
       print(sys.exc_info())
       db.session.rollback()
-  finally:
-      db.session.close()
   if error:
       # on unsuccessful db insert, flash an error instead.
       flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
@@ -599,36 +1109,11 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cache.cached('shows')
 def shows():
-  # displays list of shows
-  # get the venues and for each, get the coressponding upcoming shows with artist data
-
-  # get venues
-  venues = Venue.query.all()
-  data = []
-  for venue in venues:
-    # get upcoming shows for venue
-    upcoming_shows = db.session.query(Artist, db.cast(show.c.start_time, db.String).label('start_time'))\
-      .join(show)\
-      .filter(show.c.venue_id == venue.id)\
-      .filter(show.c.start_time >= date.today())\
-      .group_by(Artist.id).group_by(show.c.start_time)\
-      .all()
-    num_shows = len(upcoming_shows)
-    
-    # build each row
-    for current_show in upcoming_shows:
-      show_row = {'venue_id': venue.id
-      , 'venue_name': venue.name
-      , 'artist_id': current_show.Artist.id
-      , 'artist_name': current_show.Artist.name
-      , 'artist_image_link': current_show.Artist.image_link
-      , 'start_time': current_show.start_time
-      , 'num_shows': num_shows}
-      # build final returned data
-      data.append(show_row)
-
-  return render_template('pages/shows.html', shows=data)
+  # displays list of upcoming shows ordered by start time
+  page = show_listing(stream=True)
+  return render_listing('pages/shows.html', shows=page, page=page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -642,11 +1127,16 @@ def create_show_submission():
   form = ShowForm(request.form)
   try:
       if form.validate_on_submit():
-          statement = show.insert().values(venue_id=request.form['venue_id']
-          , artist_id=request.form['artist_id']
-          , start_time=request.form['start_time'])
-          db.session.execute(statement)
+          values = {'venue_id': form.venue_id.data, 'artist_id': form.artist_id.data, 'start_time': form.start_time.data}
+          rows, clashes = check_show_conflicts([(None, values)])
+          if clashes:
+              flash('Show could not be listed, the ' + clashes[0][1] + '.')
+              return render_template('forms/new_show.html', form=form)
+          db.session.execute(show.insert().values(**values))
+          count_shows(Venue, [values])
+          count_shows(Artist, [values])
           db.session.commit()
+          cache.invalidate('shows', 'venues', 'venue:%s' % values['venue_id'], 'artist:%s' % values['artist_id'])
       else:
           flash('An error occurred. Show could not be listed.')
           return render_template('forms/new_show.html', form=form)
@@ -657,8 +1147,6 @@ def create_show_submission():
       error = True
       print(sys.exc_info())
       db.session.rollback()
-  finally:
-      db.session.close()
   if error:
       # on unsuccessful db insert, flash an error instead.
       flash('An error occurred. Show could not be listed.')
@@ -672,32 +1160,191 @@ def create_show_submission():
 def search_shows():
   # using search term, search the shows in incase-sesitive
   # actually we search in names of both venues and articles to get any match
-  data = []
-    # get upcoming shows based on search_term
-  shows = db.session.query(Artist.id, Artist.name, Artist.image_link, Venue.id, Venue.name, db.cast(show.c.start_time, db.String).label('start_time'))\
-    .join(show, Venue.id == show.c.venue_id)\
-    .filter(show.c.artist_id == Artist.id)\
-    .filter(or_(Venue.name.ilike('%' + request.form.get('search_term') +'%'),\
-    Artist.name.ilike('%' + request.form.get('search_term') +'%')))\
-    .group_by(Artist.id).group_by(Venue.id).group_by(show.c.start_time)\
-    .all() 
-      
-  num_shows = len(shows)
-    
-  # build each row
-  for current_show in shows:
-    show_row = {'venue_id': current_show[3] # venue id
-    , 'venue_name': current_show[4] # venue name
-    , 'artist_id': current_show[0] # artist id
-    , 'artist_name': current_show[1] # artist name
-    , 'artist_image_link': current_show[2] # artist image_link
-    , 'start_time': current_show.start_time
-    }
-    # build final returned data
-    data.append(show_row)
-  # add num_shows and data to the response
-  response = {"count" : num_shows, "data" : data}  
-  return render_template('pages/show.html', results=response, search_term=request.form.get('search_term', ''))
+  page = show_search(request.form.get('search_term', ''))
+  response = {"count" : page.count, "data" : page.items}
+  return render_template('pages/show.html', results=response, page=page, search_term=request.form.get('search_term', ''))
+
+#  API
+#  ----------------------------------------------------------------
+#  read-only JSON over the same queries as the pages
+#  ?fields=id,name picks fields, ?after=/?before= walk pages,
+#  and If-None-Match with the returned ETag answers 304 when nothing changed
+
+def select_fields(item):
+  fields = request.args.get('fields')
+  if not fields:
+    return item
+  return {field: item[field] for field in fields.split(',') if field in item}
+
+def api_response(payload, status=200):
+  # compact json, the etag is a hash of the body
+  response = app.response_class(json.dumps(payload, separators=(',', ':'), default=str),
+    status=status, mimetype='application/json')
+  response.add_etag()
+  return response.make_conditional(request)
+
+def api_page(page):
+  payload = {'data': [select_fields(item) for item in page.items],
+    'next': page.next_cursor, 'prev': page.prev_cursor}
+  if page.count is not None:
+    payload['count'] = page.count
+  return api_response(payload)
+
+def api_details(data):
+  if data is None:
+    return api_response({'error': 'Not found'}, 404)
+  return api_response(select_fields(data))
+
+@app.route('/api/v1/venues')
+@cache.cached('venues')
+def api_venues():
+  return api_page(venue_listing())
+
+@app.route('/api/v1/venues/search')
+def api_search_venues():
+  return api_page(venue_search(request.args.get('q', '')))
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
+def api_venue(venue_id):
+  return api_details(venue_details(venue_id))
+
+@app.route('/api/v1/venues/<int:venue_id>/availability')
+def api_venue_availability(venue_id):
+  # free time at a venue from ?from=YYYY-MM-DD (default today) for ?days= days,
+  # a new show can start anywhere in a slot that leaves room for its duration
+  if db.session.query(Venue.id).filter_by(id=venue_id).first() is None:
+    return api_response({'error': 'Not found'}, 404)
+  try:
+    start = datetime.strptime(request.args['from'], '%Y-%m-%d') if 'from' in request.args \
+      else datetime.combine(date.today(), time())
+    days = min(max(int(request.args.get('days', 7)), 1), app.config['AVAILABILITY_MAX_DAYS'])
+  except ValueError:
+    return api_response({'error': 'from must be a YYYY-MM-DD date and days a number'}, 400)
+  end = start + timedelta(days=days)
+  duration = show_duration()
+  starts = [start_time for venue_id, start_time in booked_shows(show.c.venue_id, [venue_id], start - duration, end)]
+  # slots in the past cannot be booked
+  slots = free_slots(starts, max(start, datetime.today().replace(microsecond=0)), end, duration)
+  return api_response({'venue_id': venue_id, 'from': start, 'to': end,
+    'duration_minutes': app.config['SHOW_DURATION_MINUTES'],
+    'slots': [{'start': slot_start, 'end': slot_end} for slot_start, slot_end in slots]})
+
+@app.route('/api/v1/artists')
+@cache.cached('artists')
+def api_artists():
+  return api_page(artist_listing())
+
+@app.route('/api/v1/artists/search')
+def api_search_artists():
+  return api_page(artist_search(request.args.get('q', '')))
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
+def api_artist(artist_id):
+  return api_details(artist_details(artist_id))
+
+@app.route('/api/v1/choices/<any(state, genre):kind>')
+@cache.cached('choices')
+def api_choices(kind):
+  # options of the state and genre fields, for clients building their own forms
+  return api_response({'kind': kind,
+    'data': [{'value': value, 'label': label} for value, label in choice_registry.choices(kind)]})
+
+@app.route('/api/v1/shows')
+@cache.cached('shows')
+def api_shows():
+  return api_page(show_listing())
+
+@app.route('/api/v1/shows/search')
+def api_search_shows():
+  return api_page(show_search(request.args.get('q', '')))
+
+@app.route('/api/v1/shows/<int:show_id>')
+@cache.cached('shows')
+def api_show(show_id):
+  return api_details(show_details(show_id))
+
+@app.route('/api/v1/shows/batch', methods=['POST'])
+def api_schedule_shows():
+  # book many shows at once, either
+  #   {"shows": [{"artist_id": 1, "venue_id": 2, "start_time": "2031-01-03 20:00:00"}, ...]}
+  # or a recurrence from the first start time
+  #   {"artist_id": 1, "venue_id": 2, "start_time": "...", "rrule": "FREQ=WEEKLY;COUNT=52"}
+  # every show is validated first, then all are inserted by one statement
+  # in one transaction, or none at all
+  payload = request.get_json(silent=True)
+  if not isinstance(payload, dict):
+    return api_response({'errors': {'payload': ['Expected a JSON object.']}}, 400)
+  if 'rrule' not in payload and not isinstance(payload.get('shows', []), list):
+    return api_response({'errors': {'shows': ['Expected a list of shows.']}}, 400)
+  limit = app.config['SCHEDULE_MAX_SHOWS']
+  if 'rrule' in payload:
+    try:
+      start = datetime.strptime(payload.get('start_time', ''), '%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError) as e:
+      return api_response({'errors': {'start_time': [str(e)]}}, 400)
+    try:
+      dates = list(islice(dateutil.rrule.rrulestr(payload['rrule'], dtstart=start), limit + 1))
+    except (ValueError, TypeError) as e:
+      return api_response({'errors': {'rrule': [str(e)]}}, 400)
+    items = [{'artist_id': payload.get('artist_id'), 'venue_id': payload.get('venue_id'),
+      'start_time': str(start_time)} for start_time in dates]
+  else:
+    items = list(payload.get('shows') or [])
+  if not items:
+    return api_response({'errors': {'shows': ['No shows to schedule.']}}, 400)
+  if len(items) > limit:
+    return api_response({'errors': {'shows': ['At most %d shows per batch.' % limit]}}, 400)
+  rows, errors = [], {}
+  for index, item in enumerate(items):
+    data, item_errors = validate_row(ShowForm, item if isinstance(item, dict) else {}, check_references=False)
+    if item_errors:
+      errors[index] = item_errors
+    else:
+      rows.append((index, {column: data[column] for column in ('venue_id', 'artist_id', 'start_time')}))
+  rows, missing = check_show_references(rows)
+  errors.update(missing)
+  if not errors:
+    rows, clashes = check_show_conflicts(rows)
+    errors.update(clashes)
+  if errors:
+    return api_response({'errors': errors}, 400)
+  values = [values for index, values in rows]
+  venue_ids = {row['venue_id'] for row in values}
+  artist_ids = {row['artist_id'] for row in values}
+  try:
+    ids = [row.id for row in db.session.execute(show.insert().values(values).returning(show.c.id))]
+    count_shows(Venue, values)
+    count_shows(Artist, values)
+    db.session.commit()
+  except SQLAlchemyError:
+    db.session.rollback()
+    app.logger.exception('batch of %d shows could not be inserted', len(values))
+    return api_response({'errors': {'shows': ['An error occurred. Shows could not be listed.']}}, 500)
+  cache.invalidate('shows', 'venues', *['venue:%s' % venue_id for venue_id in venue_ids]
+    + ['artist:%s' % artist_id for artist_id in artist_ids])
+  return api_response({'count': len(ids), 'ids': ids}, 201)
+
+#  Export
+#  ----------------------------------------------------------------
+
+export_tables = {'venues': Venue.__table__, 'artists': Artist.__table__, 'shows': show}
+
+@app.route('/export/<kind>')
+def export(kind):
+  # whole table as gzipped CSV (default) or JSONL (?format=jsonl), streamed
+  if kind not in export_tables:
+    abort(404)
+  fmt = request.args.get('format', 'csv')
+  if fmt not in ('csv', 'jsonl'):
+    abort(400)
+  table = export_tables[kind]
+  serialize = csv_chunks if fmt == 'csv' else jsonl_chunks
+  batches = stream_batches(db.session, table, app.config['EXPORT_BATCH_SIZE'])
+  body = gzip_chunks(serialize([column.name for column in table.columns], batches))
+  return Response(stream_with_context(body), mimetype='application/gzip',
+    headers={'Content-Disposition': 'attachment; filename=%s.%s.gz' % (kind, fmt)})
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -708,6 +1355,110 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# kind: (table, form validating a row, columns inserted from the form data)
+import_targets = {
+  'venues': (Venue.__table__, VenueForm, ['name', 'city', 'state', 'address', 'phone', 'genres',
+    'facebook_link', 'image_link', 'website', 'seeking_talent', 'seeking_description']),
+  'artists': (Artist.__table__, ArtistForm, ['name', 'city', 'state', 'phone', 'genres',
+    'facebook_link', 'image_link', 'seeking_venue', 'seeking_description']),
+  'shows': (show, ShowForm, ['venue_id', 'artist_id', 'start_time']),
+}
+
+def warn_process_cache():
+  # a memory cache lives in each server process, a command cannot reach it
+  if app.config['CACHE_TYPE'] == 'memory':
+    click.echo('warning: CACHE_TYPE is memory, running servers keep cached pages for up to '
+      '%d seconds; set FYYUR_CACHE_TYPE=redis to clear them from here' % app.config['CACHE_DEFAULT_TIMEOUT'], err=True)
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(list(import_targets)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per INSERT, defaults to IMPORT_BATCH_SIZE.')
+def import_command(kind, path, fmt, batch_size):
+  """Import venues, artists or shows from a CSV or JSONL file."""
+  table, form_class, columns = import_targets[kind]
+  stats = ImportStats()
+  for chunk in chunks(read_rows(path, fmt), batch_size or app.config['IMPORT_BATCH_SIZE']):
+    rows, rejects = [], []
+    for line, row in chunk:
+      data, errors = validate_row(form_class, row, check_references=False)
+      if errors:
+        rejects.append((line, errors))
+      else:
+        rows.append((line, {column: data[column] for column in columns}))
+    if kind == 'shows':
+      rows, missing = check_show_references(rows)
+      rows, clashes = check_show_conflicts(rows)
+      rejects += missing + clashes
+    for line, errors in rejects:
+      click.echo('line %d rejected: %s' % (line, errors), err=True)
+    stats.read += len(chunk)
+    stats.rejected += len(rejects)
+    if rows:
+      stats.inserted += insert_ignoring_conflicts(db.session, table, [values for line, values in rows])
+      if kind == 'shows':
+        count_shows(Venue, [values for line, values in rows])
+        count_shows(Artist, [values for line, values in rows])
+      db.session.commit()
+    click.echo(str(stats))
+  if kind in ('venues', 'artists'):
+    refresh_facets(Venue if kind == 'venues' else Artist)
+  # a bulk load touches too many pages to invalidate one by one
+  cache.clear()
+  warn_process_cache()
+
+@app.cli.command('recount-shows')
+@click.option('--days', type=int, default=1, help='Look back this many days for shows that have started.')
+@click.option('--all', 'everything', is_flag=True, help='Recount every venue and artist.')
+def recount_shows_command(days, everything):
+  """Move shows that have started into the past show counters.
+
+  Run it daily soon after midnight, e.g. from cron.
+  """
+  if everything:
+    recount_shows(Venue)
+    recount_shows(Artist)
+  else:
+    today = datetime.combine(date.today(), time())
+    started = db.session.query(show.c.venue_id, show.c.artist_id)\
+      .filter(show.c.start_time >= today - timedelta(days=days), show.c.start_time < today).all()
+    recount_shows(Venue, {row.venue_id for row in started})
+    recount_shows(Artist, {row.artist_id for row in started})
+  db.session.commit()
+  cache.invalidate('venues', 'artists')
+  warn_process_cache()
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(list(export_tables)))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl', 'parquet']), default='csv')
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+  help='Defaults to stdout, a name ending in .gz is gzipped.')
+@click.option('--batch-size', type=int, help='Rows per fetch, defaults to EXPORT_BATCH_SIZE.')
+def export_command(kind, fmt, output, batch_size):
+  """Export all venues, artists or shows as CSV, JSONL or Parquet."""
+  table = export_tables[kind]
+  columns = [column.name for column in table.columns]
+  batches = stream_batches(db.session, table, batch_size or app.config['EXPORT_BATCH_SIZE'])
+  if fmt == 'parquet':
+    if not output:
+      raise click.UsageError('--output is required for parquet')
+    write_parquet(output, columns, batches)
+    return
+  chunks = (csv_chunks if fmt == 'csv' else jsonl_chunks)(columns, batches)
+  if output and output.endswith('.gz'):
+    with open(output, 'wb') as f:
+      for data in gzip_chunks(chunks):
+        f.write(data)
+  else:
+    with click.open_file(output or '-', 'w') as f:
+      for chunk in chunks:
+        f.write(chunk)
+
 if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
@@ -715,7 +1466,12 @@ if not app.debug:
     )
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    # requests only queue their records, a listener thread writes the file
+    log_queue = queue.Queue()
+    log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    app.logger.addHandler(QueueHandler(log_queue))
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
@@ -0,0 +1,55 @@
+"""Per-row cost of the datetime filter on a 5,000 show page.
+
+    python benchmarks/format_datetime.py --shows 5000 --repeat 5
+
+"before" is the filter as it was: a start_time string cast by SQL, parsed
+again with dateutil and formatted by babel.dates.format_datetime, which
+parses the pattern on every call. "after" is the app's filter fed the
+datetime the handlers now pass, with the compiled pattern cached.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--shows', type=int, default=5000)
+parser.add_argument('--repeat', type=int, default=5)
+options = parser.parse_args()
+
+# importing the app connects nothing, it only needs a database url
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'fyyur-bench.sqlite'))
+os.environ['FYYUR_JOBS_TYPE'] = 'sync'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import format_datetime
+
+
+def format_datetime_before(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    first = datetime(2031, 1, 3, 20, 0)
+    start_times = [first + timedelta(hours=7 * number) for number in range(options.shows)]
+    strings = [str(start_time) for start_time in start_times]
+    assert [format_datetime_before(value, 'full') for value in strings[:50]] \
+        == [format_datetime(value, 'full') for value in start_times[:50]]
+    for name, run in (('before', lambda: [format_datetime_before(value, 'full') for value in strings]),
+                      ('after', lambda: [format_datetime(value, 'full') for value in start_times])):
+        seconds = min(timeit.repeat(run, number=1, repeat=options.repeat))
+        print('%-6s %8.1fms per page  %6.1fus per row' % (name, seconds * 1000, seconds / options.shows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Seed a scratch database with many shows and check the detail page plans.
+
+    python benchmarks/show_indexes.py postgresql://localhost/fyyur_bench --shows 1000000
+
+The venue and artist page queries are captured while they run, then
+EXPLAINed: every step reading "Show" must go through one of its indexes.
+Exits with status 1 when a plan scans the table. The database is filled
+with generated venues, artists and shows, never point it at real data.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('database', help='url of an empty scratch database')
+parser.add_argument('--shows', type=int, default=1000000)
+parser.add_argument('--venues', type=int, default=1000)
+parser.add_argument('--artists', type=int, default=1000)
+parser.add_argument('--batch', type=int, default=10000)
+options = parser.parse_args()
+
+# the app reads its database while being imported
+os.environ['DATABASE_URL'] = options.database
+os.environ['FYYUR_JOBS_TYPE'] = 'sync'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, text
+from app import app, db, Venue, Artist, show, venue_details, artist_details
+
+
+def seed():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.commit()
+    db.create_all()
+    if db.session.query(Venue.id).first() is not None:
+        sys.exit('%s already has venues, use an empty database' % options.database)
+    db.session.execute(Venue.__table__.insert(), [
+        {'name': 'Venue %d' % number, 'city': 'City %d' % (number % 50), 'state': 'NY', 'genres': ['Jazz']}
+        for number in range(options.venues)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'name': 'Artist %d' % number, 'city': 'City %d' % (number % 50), 'state': 'NY', 'genres': ['Rock']}
+        for number in range(options.artists)])
+    db.session.commit()
+    # a year of history and a year ahead
+    started = time.perf_counter()
+    first = datetime.utcnow() - timedelta(days=365)
+    for offset in range(0, options.shows, options.batch):
+        db.session.execute(show.insert(), [
+            {'venue_id': random.randint(1, options.venues), 'artist_id': random.randint(1, options.artists),
+             'start_time': first + timedelta(minutes=random.randint(0, 2 * 365 * 24 * 60))}
+            for number in range(offset, min(offset + options.batch, options.shows))])
+        db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    print('seeded %d shows in %.1fs' % (options.shows, time.perf_counter() - started))
+
+
+def captured(function, *args):
+    # the statements function runs, with their parameters
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        started = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - started
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    return statements, seconds
+
+
+def explain(statement, parameters):
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+            return [row[0] for row in rows]
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in rows]
+
+
+def scans_show(plan):
+    # postgres: Seq Scan on "Show", sqlite: SCAN Show without an index
+    return any(('Seq Scan on "Show"' in line or 'Seq Scan on Show' in line)
+               or (line.startswith('SCAN Show') and 'INDEX' not in line) for line in plan)
+
+
+def main():
+    failed = False
+    with app.test_request_context():
+        seed()
+        for name, function in (('show_venue', venue_details), ('show_artist', artist_details)):
+            statements, seconds = captured(function, 1)
+            print('\n%s: %d statements, %.1fms' % (name, len(statements), seconds * 1000))
+            for statement, parameters in statements:
+                if 'Show' not in statement:
+                    continue
+                plan = explain(statement, parameters)
+                print('\n'.join('    ' + line for line in plan))
+                if scans_show(plan):
+                    failed = True
+                    print('    FAIL: scans "Show"')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import bisect
+
+# double-booking checks
+# a show only has a start time, so each one is taken to hold its venue and its
+# artist for a fixed duration and two shows clash when their starts are closer
+# than that. start times are kept sorted per venue or artist, which makes each
+# check a binary search
+
+
+class Bookings:
+    def __init__(self, duration):
+        self.duration = duration
+        self.starts = {}
+
+    def add(self, key, start_time):
+        bisect.insort(self.starts.setdefault(key, []), start_time)
+
+    def clashes(self, key, start_time):
+        # is there a booked start in (start_time - duration, start_time + duration)
+        starts = self.starts.get(key, ())
+        index = bisect.bisect_right(starts, start_time - self.duration)
+        return index < len(starts) and starts[index] < start_time + self.duration
+
+
+def free_slots(starts, window_start, window_end, duration):
+    # (start, end) gaps between the booked starts that fit a whole show,
+    # shows starting before the window still hold its beginning
+    slots, free_from = [], window_start
+    for start in sorted(starts):
+        if start - free_from >= duration:
+            slots.append((free_from, start))
+        free_from = max(free_from, start + duration)
+    if window_end - free_from >= duration:
+        slots.append((free_from, window_end))
+    return slots
@@ -0,0 +1,206 @@
+import functools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, request, session
+
+# response cache for read-heavy pages
+# entries are keyed on the request path and query string, and carry tags
+# (e.g. 'venues', 'venue:3') so writes can drop exactly the pages they affect
+
+# response headers kept with a cached body, the rest is per request
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class MemoryBackend:
+    # in-process LRU with a per-entry time to live
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires, tags = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, tags=()):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, time.monotonic() + timeout, tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tag):
+        with self.lock:
+            for key in list(self.tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remove(self, key):
+        value, expires, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisBackend:
+    # shared between workers, tags are redis sets of the keys they cover
+    def __init__(self, url, prefix='fyyur:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, pickle.dumps(value), ex=int(timeout))
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, key)
+            pipe.expire(self.prefix + 'tag:' + tag, int(timeout))
+        pipe.execute()
+
+    def invalidate(self, tag):
+        keys = self.client.smembers(self.prefix + 'tag:' + tag)
+        self.client.delete(self.prefix + 'tag:' + tag,
+                           *[self.prefix + key.decode() for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for key in self.client.scan_iter(self.prefix + '*')
+                   if not key.startswith((self.prefix + 'tag:').encode()))
+
+
+class NullBackend:
+    # caching turned off
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout, tags=()):
+        pass
+
+    def invalidate(self, tag):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.timeout = 60
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # CACHE_TYPE is 'memory', 'redis' or 'null'
+        cache_type = app.config.get('CACHE_TYPE', 'memory')
+        self.timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        if cache_type == 'memory':
+            self.backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+        elif cache_type == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = NullBackend()
+
+    def cached(self, *tags):
+        # tags are formatted with the view arguments, e.g. 'venue:{venue_id}'
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # pages carrying flashed messages are per user, never share them;
+                # a client that just wrote reads from the primary and skips the
+                # cache both ways: an entry refilled from a lagging replica may
+                # predate its write
+                if request.method != 'GET' or session.get('_flashes') or g.get('primary_reads'):
+                    return view(*args, **kwargs)
+                key = request.full_path
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count(hit=True)
+                    data, status, mimetype, headers = entry
+                    response = current_app.response_class(data, status=status, mimetype=mimetype,
+                                                          headers=headers)
+                    return response.make_conditional(request)
+                self._count(hit=False)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough \
+                        and not session.get('_flashes'):
+                    headers = [(name, value) for name, value in response.headers
+                               if name in CACHED_HEADERS]
+                    entry_tags = [tag.format(**kwargs) for tag in tags]
+                    if response.is_streamed:
+                        response.response = self._tee(key, response.response, response, headers, entry_tags)
+                    else:
+                        self.backend.set(key, (response.get_data(), response.status_code, response.mimetype, headers),
+                                         self.timeout, entry_tags)
+                return response
+            return wrapper
+        return decorator
+
+    def _tee(self, key, body, response, headers, tags):
+        # send a streamed body as it is generated and cache it once complete,
+        # a client hanging up midway leaves nothing cached
+        chunks = []
+        for chunk in body:
+            chunks.append(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            yield chunk
+        self.backend.set(key, (b''.join(chunks), response.status_code, response.mimetype, headers),
+                         self.timeout, tags)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.invalidate(tag)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'entries': len(self.backend),
+                'hit_ratio': hits / total if total else 0.0}
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
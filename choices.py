@@ -0,0 +1,102 @@
+import threading
+import time
+from flask import current_app
+from markupsafe import Markup, escape
+from wtforms.validators import ValidationError
+from wtforms.widgets import html_params
+
+# options of the state and genre fields
+# they live in the Choice table (seeded from DEFAULT_CHOICES) and are loaded
+# once per kind into a process cache holding the (value, label) list, a set
+# of the values for validation and the rendered <option> markup
+
+DEFAULT_CHOICES = {
+    'state': [(state, state) for state in (
+        'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID',
+        'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM',
+        'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'PA',
+        'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY')],
+    'genre': [(genre, genre) for genre in (
+        'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+        'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+        'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other')],
+}
+
+
+class ChoiceSet:
+    def __init__(self, choices):
+        self.choices = choices
+        self.values = frozenset(value for value, label in choices)
+        # (value, option, option when selected), escaped once here
+        self.options = [(value,
+                         '<option value="%s">%s</option>' % (escape(value), escape(label)),
+                         '<option selected value="%s">%s</option>' % (escape(value), escape(label)))
+                        for value, label in choices]
+
+
+class ChoiceRegistry:
+    def __init__(self):
+        self.sets = {}
+        self.lock = threading.Lock()
+
+    def get(self, kind):
+        # the ChoiceSet of kind, reloaded after CHOICES_TIMEOUT seconds so
+        # edits to the table reach every process
+        entry = self.sets.get(kind)
+        if entry is None or entry[0] < time.monotonic():
+            choice_set = ChoiceSet(self._load(kind))
+            entry = (time.monotonic() + current_app.config.get('CHOICES_TIMEOUT', 300), choice_set)
+            with self.lock:
+                self.sets[kind] = entry
+        return entry[1]
+
+    def choices(self, kind):
+        return self.get(kind).choices
+
+    def clear(self):
+        with self.lock:
+            self.sets.clear()
+
+    def _load(self, kind):
+        db = current_app.extensions['sqlalchemy']
+        table = db.metadata.tables['Choice']
+        rows = db.session.query(table.c.value, table.c.label)\
+            .filter(table.c.kind == kind).order_by(table.c.position, table.c.value).all()
+        # an empty table (e.g. a database made with create_all) falls back to the defaults
+        return [(row.value, row.label) for row in rows] or DEFAULT_CHOICES[kind]
+
+
+registry = ChoiceRegistry()
+
+
+def choices_of(kind):
+    # callable for a field's choices, evaluated when a form is created
+    return lambda: registry.choices(kind)
+
+
+def one_of(kind):
+    # set membership in place of the select fields' scan of their choices
+    def validator(form, field):
+        values = field.data if isinstance(field.data, (list, tuple)) else [field.data]
+        if not registry.get(kind).values.issuperset(values):
+            raise ValidationError('Not a valid choice.')
+    return validator
+
+
+class ChoiceSelect:
+    # <select> built from the cached option markup, only the selected
+    # options differ between forms
+    def __init__(self, kind, multiple=False):
+        self.kind = kind
+        self.multiple = multiple
+
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        if self.multiple:
+            kwargs['multiple'] = True
+        if 'required' not in kwargs and 'required' in getattr(field, 'flags', []):
+            kwargs['required'] = True
+        selected = set(field.data or ()) if self.multiple else {field.data}
+        options = ''.join(option_selected if value in selected else option
+                          for value, option, option_selected in registry.get(self.kind).options)
+        return Markup('<select %s>%s</select>' % (html_params(name=field.name, **kwargs), options))
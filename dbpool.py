@@ -0,0 +1,59 @@
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+# connection pool that records how long checkouts take
+# the time includes waiting for a free connection and opening a new one
+
+
+class PoolTimings:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def as_dict(self):
+        with self.lock:
+            return {'checkouts': self.checkouts,
+                    'wait_total': round(self.wait_total, 6),
+                    'wait_max': round(self.wait_max, 6),
+                    'wait_avg': round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0}
+
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = PoolTimings()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.timings.record(time.perf_counter() - start)
+
+    def recreate(self):
+        # a pool is recreated when the engine is disposed, keep the timings
+        pool = super().recreate()
+        pool.timings = self.timings
+        return pool
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({'size': pool.size(),
+                      'checked_in': pool.checkedin(),
+                      'checked_out': pool.checkedout(),
+                      'overflow': pool.overflow()})
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.timings.as_dict())
+    return stats
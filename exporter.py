@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from sqlalchemy import select
+
+# streaming export of whole tables
+# rows come from a server-side cursor one batch at a time, and each batch is
+# serialized (and compressed) before the next is fetched, so memory stays
+# flat whatever the table size
+
+
+def stream_batches(session, table, batch_size):
+    # lists of row mappings in id order
+    statement = select(table).order_by(table.c.id)\
+        .execution_options(stream_results=True, yield_per=batch_size)
+    result = session.execute(statement)
+    for batch in result.mappings().partitions(batch_size):
+        yield batch
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([','.join(row[column]) if isinstance(row[column], list)
+                             else _plain(row[column]) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def jsonl_chunks(columns, batches):
+    for batch in batches:
+        yield ''.join(json.dumps({column: _plain(row[column]) for column in columns},
+                                 separators=(',', ':')) + '\n' for row in batch)
+
+
+def gzip_chunks(chunks, level=6):
+    # one gzip member written piecewise, each input chunk is compressed as it comes
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def write_parquet(path, columns, batches):
+    # each batch becomes a row group, pyarrow is only needed for this format
+    import pyarrow
+    import pyarrow.parquet
+    writer = None
+    try:
+        for batch in batches:
+            table = pyarrow.Table.from_pylist([{column: row[column] for column in columns}
+                                               for row in batch])
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
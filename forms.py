@@ -1,33 +1,40 @@
 from datetime import datetime
-from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from flask import current_app
+from flask_wtf import FlaskForm as Form
+from wtforms import StringField, IntegerField, SelectField, SelectMultipleField, DateTimeField, BooleanField
 from wtforms.validators import DataRequired, AnyOf, URL, Length, ValidationError, Optional
-import phonenumbers
+from phones import normalize_phone
+from choices import choices_of, one_of, ChoiceSelect
 
 def validate_phone(form, field):
+    # valid numbers are replaced by their E.164 form
     if len(field.data) == 0:
-        pass
         return
-    if len(field.data) > 16:
+    normalized = normalize_phone(field.data)
+    if normalized is None:
         raise ValidationError('Invalid phone number.')
-    try:
-        input_number = phonenumbers.parse(field.data)
-        if not (phonenumbers.is_valid_number(input_number)):
-            raise ValidationError('Invalid phone number.')
-    except:
-        input_number = phonenumbers.parse("+1"+field.data)
-        if not (phonenumbers.is_valid_number(input_number)):
-            raise ValidationError('Invalid phone number.')
+    field.data = normalized
 def validate_date(form, field):
     if field.data < datetime.today():
         raise ValidationError("Start time cannot be in the past!")
+def validate_reference(table_name):
+    # the id must belong to a row of that table, bulk loads checking all their
+    # references in one query turn this off with meta check_references=False
+    def validator(form, field):
+        if not getattr(form.meta, 'check_references', True):
+            return
+        db = current_app.extensions['sqlalchemy']
+        table = db.metadata.tables[table_name]
+        if db.session.query(table.c.id).filter(table.c.id == field.data).first() is None:
+            raise ValidationError('No %s with this id.' % table_name.lower())
+    return validator
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired(), validate_reference('Artist')]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired(), validate_reference('Venue')]
     )
     start_time = DateTimeField(
         'start_time',
@@ -43,60 +50,8 @@ class VenueForm(Form):
         'city', validators=[DataRequired(),Length(max=120)]
     )
     state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        'state', validators=[DataRequired(), one_of('state')],
+        choices=choices_of('state'), validate_choice=False, widget=ChoiceSelect('state')
     )
     address = StringField(
         'address', validators=[DataRequired(),Length(max=120)]
@@ -120,33 +75,12 @@ class VenueForm(Form):
         'seeking_description'
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        'genres', validators=[DataRequired(), one_of('genre')],
+        choices=choices_of('genre'), validate_choice=False, widget=ChoiceSelect('genre', multiple=True)
     )
 
-    def validate(self):                                                         
-        rv = Form.validate(self)                                           
+    def validate(self, extra_validators=None):
+        rv = Form.validate(self, extra_validators)
         if not rv:                                                              
             return False                                                        
         if len(self.genres.data) > 4:                                          
@@ -163,60 +97,8 @@ class ArtistForm(Form):
         'city', validators=[DataRequired(),Length(max=120)]
     )
     state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        'state', validators=[DataRequired(), one_of('state')],
+        choices=choices_of('state'), validate_choice=False, widget=ChoiceSelect('state')
     )
     phone = StringField(
         # TODO implement validation logic for state
@@ -226,29 +108,8 @@ class ArtistForm(Form):
         'image_link', validators=[URL(),Length(max=500),Optional()]
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        'genres', validators=[DataRequired(), one_of('genre')],
+        choices=choices_of('genre'), validate_choice=False, widget=ChoiceSelect('genre', multiple=True)
     )
     facebook_link = StringField(
         # TODO implement enum restriction
@@ -261,8 +122,8 @@ class ArtistForm(Form):
         'seeking_description'
     )
 
-    def validate(self):                                                         
-        rv = Form.validate(self)                                           
+    def validate(self, extra_validators=None):
+        rv = Form.validate(self, extra_validators)
         if not rv:                                                              
             return False                                                        
         if len(self.genres.data) > 4:                                          
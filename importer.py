@@ -0,0 +1,95 @@
+import csv
+import json
+import time
+from itertools import islice
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.datastructures import MultiDict
+
+# bulk import of catalog files
+# rows are streamed from CSV/JSONL, checked with the same forms the site
+# uses, and inserted in batches that skip rows conflicting with unique keys
+
+
+def read_rows(path, fmt=None):
+    # yield (line number, row dict) without loading the whole file
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_formdata(row, list_fields=('genres',)):
+    # shape a row like a submitted form: lists become repeated values,
+    # true booleans become 'y' and false ones are left out like an unticked box
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if value is True:
+            value = 'y'
+        if key in list_fields and isinstance(value, str):
+            value = [item.strip() for item in value.split(',') if item.strip()]
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                formdata.add(key, str(item))
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def validate_row(form_class, row, **meta):
+    # return (form data, None) or (None, errors), meta is passed on to the form
+    form = form_class(formdata=to_formdata(row), meta=dict(meta, csrf=False))
+    if form.validate():
+        return form.data, None
+    return None, form.errors
+
+
+def insert_ignoring_conflicts(session, table, values):
+    # one multi-row INSERT ... ON CONFLICT DO NOTHING, returns inserted rows
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    else:
+        statement = insert(table)
+    return session.execute(statement.values(values)).rowcount
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+
+    @property
+    def skipped(self):
+        # valid rows that conflicted with existing ones
+        return self.read - self.rejected - self.inserted
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.read / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return '%d read, %d inserted, %d skipped, %d rejected (%.0f rows/s)' % (
+            self.read, self.inserted, self.skipped, self.rejected, self.rate)
@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# background jobs for the slow side effects of requests
+# jobs are rows of a sqlite file, so queued work survives a restart and every
+# process of the app can share one queue; worker threads claim them one at a
+# time and a failing job is retried with exponential backoff until it runs out
+# of attempts
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+'''
+
+
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        connection = sqlite3.connect(path, timeout=30)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front so two workers
+        # never claim the same job
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def add(self, name, args, max_attempts, delay=0.0, unique=False):
+        # a unique job already waiting with the same arguments is reused
+        now = time.time()
+        args = json.dumps(args)
+        with self.transaction() as connection:
+            if unique:
+                job = connection.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND name = ? AND args = ? LIMIT 1",
+                    (name, args)).fetchone()
+                if job is not None:
+                    return job['id']
+            return connection.execute(
+                'INSERT INTO jobs (name, args, max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?)',
+                (name, args, max_attempts, now + delay, now)).lastrowid
+
+    def claim(self, lease):
+        # the next due job, or one whose worker died holding it for longer than lease
+        now = time.time()
+        with self.transaction() as connection:
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND run_at <= ?)"
+                " OR (status = 'running' AND claimed_at < ?) ORDER BY run_at, id LIMIT 1",
+                (now, now - lease)).fetchone()
+            if job is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                (now, job['id']))
+            return dict(job, attempts=job['attempts'] + 1)
+
+    def finish(self, job_id):
+        with self.transaction() as connection:
+            connection.execute("UPDATE jobs SET status = 'done', finished_at = ?, error = NULL WHERE id = ?",
+                               (time.time(), job_id))
+
+    def retry(self, job_id, error, run_at):
+        with self.transaction() as connection:
+            connection.execute("UPDATE jobs SET status = 'queued', run_at = ?, error = ? WHERE id = ?",
+                               (run_at, error, job_id))
+
+    def fail(self, job_id, error):
+        with self.transaction() as connection:
+            connection.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                               (time.time(), error, job_id))
+
+    def get(self, job_id):
+        with self.transaction() as connection:
+            job = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return dict(job, args=json.loads(job['args'])) if job is not None else None
+
+    def stats(self, failures=10):
+        with self.transaction() as connection:
+            counts = dict(connection.execute('SELECT status, count(*) FROM jobs GROUP BY status').fetchall())
+            oldest = connection.execute("SELECT min(run_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            failed = connection.execute(
+                "SELECT id, name, attempts, finished_at FROM jobs WHERE status = 'failed'"
+                " ORDER BY finished_at DESC LIMIT ?", (failures,)).fetchall()
+        return {'counts': {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')},
+                'oldest_queued_age': round(max(time.time() - oldest, 0.0), 3) if oldest is not None else None,
+                'recent_failures': [dict(job) for job in failed]}
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.app = None
+        self.store = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # JOBS_TYPE is 'thread' (sqlite queue and worker threads) or 'sync'
+        # (run while enqueuing, e.g. for tests)
+        self.app = app
+        self.workers = app.config.get('JOBS_WORKERS', 2)
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', 5)
+        self.retry_delay = app.config.get('JOBS_RETRY_DELAY', 2.0)
+        self.lease = app.config.get('JOBS_LEASE', 600)
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 1.0)
+        if app.config.get('JOBS_TYPE', 'thread') == 'thread':
+            self.store = JobStore(app.config['JOBS_DATABASE'])
+            # workers start with the first request, not in CLI commands
+            app.before_request(self.start)
+
+    def task(self, function):
+        # register a job function under its name, its arguments must be JSON
+        self.tasks[function.__name__] = function
+        return function
+
+    def enqueue(self, name, *args, delay=0.0, unique=False):
+        # returns the job id, None when it already ran synchronously
+        # delay holds the job back that many seconds, and with unique it
+        # joins a same job still waiting, so a burst of calls runs it once
+        if self.store is None:
+            self.tasks[name](*args)
+            return None
+        job_id = self.store.add(name, list(args), self.max_attempts, delay, unique)
+        self.start()
+        self.wakeup.set()
+        return job_id
+
+    def start(self):
+        if self.threads or self.store is None:
+            return
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name='jobs-%d' % number, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stats(self):
+        if self.store is None:
+            return {'type': 'sync'}
+        return dict(self.store.stats(), type='thread', workers=len(self.threads))
+
+    def _work(self):
+        while True:
+            try:
+                job = self.store.claim(self.lease)
+            except sqlite3.Error:
+                self.app.logger.exception('job queue unavailable')
+                job = None
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                self.tasks[job['name']](*json.loads(job['args']))
+        except Exception:
+            error = traceback.format_exc()
+            if job['attempts'] < job['max_attempts']:
+                self.store.retry(job['id'], error, time.time() + self.retry_delay * 2 ** (job['attempts'] - 1))
+            else:
+                self.store.fail(job['id'], error)
+                self.app.logger.error('job %d %s failed after %d attempts:\n%s',
+                                      job['id'], job['name'], job['attempts'], error)
+        else:
+            self.store.finish(job['id'])
@@ -0,0 +1,39 @@
+"""phone numbers of Venue and Artist in E.164
+
+Revision ID: 2b7e4f0a9c35
+Revises: 9d2f6c81e4a7
+Create Date: 2026-10-18 16:20:51.407262
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from phones import normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e4f0a9c35'
+down_revision = '9d2f6c81e4a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rewrite stored numbers the way the forms now save them; numbers that do
+    # not parse, or whose E.164 form another row already holds, are left as
+    # they are for the unique constraint's sake
+    connection = op.get_bind()
+    for name in ('Venue', 'Artist'):
+        table = sa.table(name, sa.column('id', sa.Integer), sa.column('phone', sa.String))
+        rows = connection.execute(sa.select(table.c.id, table.c.phone).where(table.c.phone != '')).fetchall()
+        taken = {row.phone for row in rows}
+        for row in rows:
+            normalized = normalize_phone(row.phone)
+            if normalized is None or normalized == row.phone or normalized in taken:
+                continue
+            connection.execute(table.update().where(table.c.id == row.id).values(phone=normalized))
+            taken.add(normalized)
+
+
+def downgrade():
+    # the original spellings are not kept
+    pass
@@ -0,0 +1,42 @@
+"""store genres as varchar arrays with GIN indexes
+
+Revision ID: 3f9a41b7c2d8
+Revises: 8e3b2c6d9f17
+Create Date: 2026-10-18 11:46:02.117430
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a41b7c2d8'
+down_revision = '8e3b2c6d9f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows hold the array literal postgres produced when a list was
+    # assigned to the string column (e.g. {Jazz,"Heavy Metal"}), so casting
+    # the text parses it back into an array
+    for table in ('Venue', 'Artist'):
+        op.alter_column(table, 'genres',
+               existing_type=sa.String(length=120),
+               type_=sa.ARRAY(sa.String(length=120)),
+               existing_nullable=True,
+               postgresql_using='genres::varchar(120)[]')
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
+    # the text form of an array is the literal the old column held
+    for table in ('Venue', 'Artist'):
+        op.alter_column(table, 'genres',
+               existing_type=sa.ARRAY(sa.String(length=120)),
+               type_=sa.String(length=120),
+               existing_nullable=True,
+               postgresql_using='genres::varchar(120)')
@@ -0,0 +1,35 @@
+"""trigram indexes for venue, artist and show search
+
+Revision ID: 5c1d7f0e2a94
+Revises: bdbe615160a8
+Create Date: 2026-10-18 10:12:40.218361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d7f0e2a94'
+down_revision = 'bdbe615160a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets name ILIKE '%term%' and similarity() use a GIN index,
+    # other databases keep scanning
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
@@ -0,0 +1,53 @@
+"""facet count views and location indexes for venue/artist browsing
+
+Revision ID: 6a0e5d93b1c4
+Revises: 3f9a41b7c2d8
+Create Date: 2026-10-18 12:21:55.830146
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0e5d93b1c4'
+down_revision = '3f9a41b7c2d8'
+branch_labels = None
+depends_on = None
+
+
+# (view, table, seeking column)
+facet_views = [
+    ('venue_facet_counts', 'Venue', 'seeking_talent'),
+    ('artist_facet_counts', 'Artist', 'seeking_venue'),
+]
+
+
+def upgrade():
+    op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city', 'id'], unique=False)
+    op.create_index('ix_Artist_state', 'Artist', ['state'], unique=False)
+    for view, table, seeking in facet_views:
+        op.execute(f'''
+            CREATE MATERIALIZED VIEW {view} AS
+            SELECT 'genre'::varchar AS facet, genre::varchar AS value, count(*) AS count
+              FROM "{table}", unnest("{table}".genres) AS genre
+             GROUP BY genre
+            UNION ALL
+            SELECT 'state', state, count(*)
+              FROM "{table}"
+             WHERE state IS NOT NULL
+             GROUP BY state
+            UNION ALL
+            SELECT 'seeking', CASE WHEN {seeking} THEN '1' ELSE '0' END, count(*)
+              FROM "{table}"
+             GROUP BY {seeking}
+        ''')
+        # a unique index is required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+        op.create_index(f'ix_{view}', view, ['facet', 'value'], unique=True)
+
+
+def downgrade():
+    for view, table, seeking in facet_views:
+        op.execute(f'DROP MATERIALIZED VIEW {view}')
+    op.drop_index('ix_Artist_state', table_name='Artist')
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
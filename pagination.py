@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import literal, tuple_
+
+# keyset (cursor) pagination
+# a cursor holds the sort key values of the first/last row of a page,
+# so the next page is a range scan from that key instead of an OFFSET
+
+
+def encode_cursor(values):
+    # datetimes are tagged so they are decoded back to datetimes
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value
+               for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    # return None for a missing or tampered cursor, the caller starts from page 1
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+                for value in payload]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, count=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StreamedPage(Page):
+    # a forward page read from a server-side cursor while it is iterated,
+    # the cursors are set once the loop has read the page, so templates
+    # place the pager after it
+    # the cursor gets a connection of its own, opened by the loop and closed
+    # when it ends: a streamed response is sent after the request's session
+    # is removed, which would invalidate a cursor opened on it
+    def __init__(self, bind, statement, names, per_page, has_prev, transform, batch_size):
+        super().__init__(self._rows(bind, statement, names, per_page, has_prev, transform, batch_size))
+
+    def _rows(self, bind, statement, names, per_page, has_prev, transform, batch_size):
+        def cursor(row):
+            return encode_cursor([getattr(row, name) for name in names])
+        with bind.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size)\
+                .execute(statement)
+            try:
+                last = None
+                for number, row in enumerate(result):
+                    if number == per_page:
+                        # the extra row only tells there is a next page
+                        self.next_cursor = cursor(last)
+                        break
+                    if number == 0 and has_prev:
+                        self.prev_cursor = cursor(row)
+                    last = row
+                    yield transform(row)
+            finally:
+                result.close()
+
+    def __bool__(self):
+        return True
+
+
+def _key_values(keys, values):
+    return tuple_(*[literal(value, key.type) for key, value in zip(keys, values)])
+
+
+def paginate(query, keys, after=None, before=None, per_page=20):
+    # keys are the sort columns, the last one must be unique (usually the id)
+    # rows must expose the keys as attributes with the same names
+    names = [key.key for key in keys]
+    after = decode_cursor(after)
+    before = decode_cursor(before)
+    if before is not None and len(before) == len(keys):
+        # walk backwards from the cursor, then restore the natural order
+        rows = query\
+            .filter(tuple_(*keys) < _key_values(keys, before))\
+            .order_by(*[key.desc() for key in keys])\
+            .limit(per_page + 1)\
+            .all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        if after is not None and len(after) == len(keys):
+            query = query.filter(tuple_(*keys) > _key_values(keys, after))
+        else:
+            after = None
+        rows = query.order_by(*keys).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    def cursor(row):
+        return encode_cursor([getattr(row, name) for name in names])
+
+    return Page(rows,
+                next_cursor=cursor(rows[-1]) if rows and has_next else None,
+                prev_cursor=cursor(rows[0]) if rows and has_prev else None)
+
+
+def stream_page(session, query, keys, after=None, per_page=20, transform=None, batch_size=100):
+    # like paginate going forward, the rows are fetched batch_size at a
+    # time and passed through transform as the page is iterated
+    # the session only chooses the engine (primary or replica)
+    names = [key.key for key in keys]
+    after = decode_cursor(after)
+    if after is not None and len(after) == len(keys):
+        query = query.filter(tuple_(*keys) > _key_values(keys, after))
+    else:
+        after = None
+    # only the engine is picked now, nothing runs until the page is iterated
+    statement = query.order_by(*keys).limit(per_page + 1).statement
+    return StreamedPage(session.get_bind(clause=statement), statement, names, per_page,
+                        after is not None, transform or (lambda row: row), batch_size)
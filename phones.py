@@ -0,0 +1,40 @@
+import functools
+
+# phone number validation and normalization
+# numbers are stored in E.164 (+15125550101) so the unique phone columns
+# compare one spelling per number. phonenumbers is imported on the first
+# number checked and loads each region's metadata on first use; results are
+# memoized, bulk imports repeat the same few formats and numbers
+
+DEFAULT_REGION = 'US'
+CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def normalize_phone(number, region=DEFAULT_REGION):
+    # E.164 form of a valid number or None, numbers without a +country
+    # prefix are read as numbers of region
+    import phonenumbers
+    try:
+        parsed = phonenumbers.parse(number, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def display_phone(number, region=DEFAULT_REGION):
+    # national format for numbers of region, international for the rest,
+    # values that do not parse are shown as stored
+    if not number:
+        return number
+    import phonenumbers
+    try:
+        parsed = phonenumbers.parse(number, region)
+    except phonenumbers.NumberParseException:
+        return number
+    if phonenumbers.region_code_for_number(parsed) == region:
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.NATIONAL)
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
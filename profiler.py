@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from collections import Counter
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# opt-in request profiling
+# a sampled request records its wall time, the SQL statements it ran and
+# their time (engine events, every bind), and the time spent rendering
+# templates; the same statement run many times in one request is reported as
+# a likely N+1 loop. totals per endpoint are served in the Prometheus text
+# format, and are per process
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    def __init__(self, endpoint, method, path):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.status = 500
+        self.streamed = False
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_starts = []
+        self.statements = Counter()
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.durations = {}
+        self.sql_count = Counter()
+        self.sql_time = Counter()
+        self.template_time = Counter()
+        self.n_plus_one = Counter()
+
+    def record(self, endpoint, method, status, profile, seconds, repeated):
+        with self.lock:
+            self.requests[(endpoint, method, status)] += 1
+            buckets, total, count = self.durations.get(endpoint, ([0] * len(BUCKETS), 0.0, 0))
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            self.durations[endpoint] = (buckets, total + seconds, count + 1)
+            self.sql_count[endpoint] += profile.sql_count
+            self.sql_time[endpoint] += profile.sql_time
+            self.template_time[endpoint] += profile.template_time
+            self.n_plus_one[endpoint] += repeated
+
+    def render(self, sample_rate):
+        # text exposition format 0.0.4
+        def labels(**values):
+            return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                     for name, value in values.items())
+        lines = ['# HELP fyyur_profile_sample_rate Share of requests profiled.',
+                 '# TYPE fyyur_profile_sample_rate gauge',
+                 'fyyur_profile_sample_rate %s' % sample_rate]
+        with self.lock:
+            lines += ['# HELP fyyur_requests_total Profiled requests.',
+                      '# TYPE fyyur_requests_total counter']
+            lines += ['fyyur_requests_total%s %d' % (labels(endpoint=endpoint, method=method, status=status), count)
+                      for (endpoint, method, status), count in sorted(self.requests.items())]
+            lines += ['# HELP fyyur_request_duration_seconds Wall time of profiled requests.',
+                      '# TYPE fyyur_request_duration_seconds histogram']
+            for endpoint, (buckets, total, count) in sorted(self.durations.items()):
+                lines += ['fyyur_request_duration_seconds_bucket%s %d' % (labels(endpoint=endpoint, le=bound), hits)
+                          for bound, hits in zip(BUCKETS, buckets)]
+                lines += ['fyyur_request_duration_seconds_bucket%s %d' % (labels(endpoint=endpoint, le='+Inf'), count),
+                          'fyyur_request_duration_seconds_sum%s %.6f' % (labels(endpoint=endpoint), total),
+                          'fyyur_request_duration_seconds_count%s %d' % (labels(endpoint=endpoint), count)]
+            for name, kind, text, values in (
+                    ('fyyur_sql_statements_total', 'counter', 'SQL statements run by profiled requests.', self.sql_count),
+                    ('fyyur_sql_duration_seconds_total', 'counter', 'Time profiled requests spent in SQL.', self.sql_time),
+                    ('fyyur_template_duration_seconds_total', 'counter',
+                     'Time profiled requests spent rendering templates, SQL of streamed pages included.',
+                     self.template_time),
+                    ('fyyur_n_plus_one_total', 'counter', 'Statements repeated past the N+1 threshold.', self.n_plus_one)):
+                lines += ['# HELP %s %s' % (name, text), '# TYPE %s %s' % (name, kind)]
+                lines += ['%s%s %s' % (name, labels(endpoint=endpoint), round(value, 6))
+                          for endpoint, value in sorted(values.items())]
+        return '\n'.join(lines) + '\n'
+
+
+class RequestProfiler:
+    def __init__(self, app=None):
+        self.metrics = Metrics()
+        self.sample_rate = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # PROFILE_ENABLED turns it on, PROFILE_SAMPLE_RATE is the share of requests profiled
+        self.app = app
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.1)
+        self.n_plus_one = app.config.get('PROFILE_N_PLUS_ONE', 5)
+        self.slow_seconds = app.config.get('PROFILE_SLOW_SECONDS', 1.0)
+        if not app.config.get('PROFILE_ENABLED', False):
+            return
+        app.before_request(self._start)
+        # a streamed body is generated after the view returns: teardown runs
+        # before it starts (and again once stream_with_context is done), so
+        # only the body wrapper set up in _status can time streamed pages;
+        # _finish records the other requests
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+    def render(self):
+        return self.metrics.render(self.sample_rate)
+
+    def _profile(self):
+        return g.get('profile') if has_app_context() else None
+
+    def _start(self):
+        if random.random() < self.sample_rate:
+            g.profile = RequestProfile(request.url_rule.rule if request.url_rule is not None else 'unmatched',
+                                       request.method, request.path)
+
+    def _status(self, response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile.status = response.status_code
+            if response.is_streamed:
+                # record once the last chunk is sent, teardown came too early
+                profile.streamed = True
+                response.response = self._streamed(response.response, profile)
+        return response
+
+    def _streamed(self, body, profile):
+        try:
+            yield from body
+        finally:
+            self._record(profile)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._profile() is not None:
+            conn.info.setdefault('profile_starts', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._profile()
+        if profile is None or not conn.info.get('profile_starts'):
+            return
+        profile.sql_count += 1
+        profile.sql_time += time.perf_counter() - conn.info['profile_starts'].pop()
+        # statements are parameterized, a loop of lookups repeats the same text
+        profile.statements[statement] += 1
+
+    def _before_render(self, sender, template, context, **extra):
+        profile = self._profile()
+        if profile is not None:
+            profile.template_starts.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        profile = self._profile()
+        if profile is not None and profile.template_starts:
+            started = profile.template_starts.pop()
+            # included templates are part of the outer render
+            if not profile.template_starts:
+                profile.template_time += time.perf_counter() - started
+
+    def _finish(self, exception=None):
+        profile = g.get('profile')
+        if profile is None or profile.streamed:
+            return
+        g.pop('profile')
+        if exception is not None:
+            profile.status = 500
+        self._record(profile)
+
+    def _record(self, profile):
+        seconds = time.perf_counter() - profile.started
+        repeated = [(statement, count) for statement, count in profile.statements.items()
+                    if count >= self.n_plus_one]
+        for statement, count in repeated:
+            self.app.logger.warning('possible N+1 in %s %s: %d runs of %s', profile.method,
+                                    profile.endpoint, count, ' '.join(statement.split())[:200])
+        if seconds >= self.slow_seconds:
+            self.app.logger.warning('slow request %s %s: %.3fs, %d statements in %.3fs, templates %.3fs',
+                                    profile.method, profile.path, seconds, profile.sql_count,
+                                    profile.sql_time, profile.template_time)
+        self.metrics.record(profile.endpoint, profile.method, profile.status, profile, seconds, len(repeated))
@@ -0,0 +1,36 @@
+import random
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+# read replica routing
+# replicas are the binds named replica0, replica1, ... (see config.py)
+# statements of a GET/HEAD request run on one replica picked at random, writes, flushes
+# and every other request use the primary
+
+
+def reads_from_replica():
+    # g.primary_reads is set for clients that wrote a moment ago,
+    # so they see their own changes
+    return has_request_context() \
+        and request.method in ('GET', 'HEAD') \
+        and not g.get('primary_reads', False)
+
+
+def replica_engines(engines):
+    return [engine for key, engine in engines.items()
+            if key is not None and key.startswith('replica')]
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) \
+                and reads_from_replica():
+            # one replica per request: replicas lag by different amounts, the
+            # ETag check and the page it stands for must read the same one
+            if 'replica' not in g:
+                replicas = replica_engines(self._db.engines)
+                g.replica = random.choice(replicas) if replicas else None
+            if g.replica is not None:
+                return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,44 @@
+from sqlalchemy import case, func, or_
+from pagination import paginate
+
+# text search over one or more name columns
+# postgres ranks with pg_trgm similarity, backed by the trigram indexes of
+# migration 5c1d7f0e2a94; other databases such as sqlite rank exact,
+# prefix and substring matches instead
+
+
+def _like_pattern(term):
+    # match the term literally, % and _ typed by the user are not wildcards
+    term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%' + term + '%'
+
+
+def relevance(columns, term, dialect):
+    # lower is better so the rank sorts ascending with the other page keys
+    if dialect == 'postgresql':
+        ranks = [1 - func.similarity(column, term) for column in columns]
+        return ranks[0] if len(ranks) == 1 else func.least(*ranks)
+    ranks = [case((func.lower(column) == term.lower(), 0),
+                  (column.ilike(term + '%'), 1),
+                  else_=2) for column in columns]
+    return ranks[0] if len(ranks) == 1 else func.min(*ranks)
+
+
+def search_page(session, query, columns, term, order, with_total=True, **page_args):
+    # query selects the result columns, columns are matched against the term
+    # and order names the result columns that break ties after the rank,
+    # the last one must be unique (usually the id)
+    dialect = session.get_bind().dialect.name
+    pattern = _like_pattern(term)
+    query = query\
+        .add_columns(relevance(columns, term, dialect).label('rank'))\
+        .filter(or_(*[column.ilike(pattern, escape='\\') for column in columns]))
+    if with_total:
+        # the total rides along with the rows instead of a second count query
+        query = query.add_columns(func.count().over().label('search_total'))
+    results = query.subquery()
+    keys = [results.c.rank] + [results.c[name] for name in order]
+    page = paginate(session.query(results), keys, **page_args)
+    if with_total:
+        page.count = page.items[0].search_total if page.items else 0
+    return page
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# the app reads its settings while being imported, point it at a throwaway
+# sqlite file, run jobs inline and keep responses out of the cache
+workdir = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'fyyur.sqlite')
+os.environ['FYYUR_JOBS_TYPE'] = 'sync'
+os.environ['FYYUR_CACHE_TYPE'] = 'null'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app, db, Venue, Artist, show
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def queries(app):
+    # statements sent to the database while the test runs
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def add_venue(number, **fields):
+    venue = Venue(**dict(dict(name='Venue %d' % number, city='City %d' % number, state='NY',
+                              address='%d Main St' % number, genres=['Jazz']), **fields))
+    db.session.add(venue)
+    db.session.commit()
+    return venue.id
+
+
+def add_artist(number, **fields):
+    artist = Artist(**dict(dict(name='Artist %d' % number, city='City %d' % number, state='NY',
+                                genres=['Rock']), **fields))
+    db.session.add(artist)
+    db.session.commit()
+    return artist.id
+
+
+def add_shows(venue_id, artist_id, count):
+    # half of them past, half upcoming
+    now = datetime.utcnow()
+    db.session.execute(show.insert(), [
+        {'venue_id': venue_id, 'artist_id': artist_id,
+         'start_time': now + timedelta(days=number - count // 2, hours=1)}
+        for number in range(count)])
+    db.session.commit()
@@ -0,0 +1,20 @@
+from app import db, show
+from conftest import add_venue, add_artist, add_shows
+
+
+def test_show_details(client):
+    venue_id = add_venue(1)
+    artist_id = add_artist(1)
+    add_shows(venue_id, artist_id, 1)
+    show_id = db.session.query(show.c.id).scalar()
+    response = client.get('/api/v1/shows/%d' % show_id)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['id'], data['venue_name'], data['artist_name']) == (show_id, 'Venue 1', 'Artist 1')
+    assert client.get('/api/v1/shows/%d' % show_id,
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    response = client.get('/api/v1/shows/%d?fields=id,venue_id' % show_id)
+    assert response.get_json() == {'id': show_id, 'venue_id': venue_id}
+    response = client.get('/api/v1/shows/%d' % (show_id + 1))
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Not found'}
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+import app as fyyur
+from cache import MemoryBackend
+from conftest import add_venue
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(fyyur.cache, 'backend', MemoryBackend())
+    monkeypatch.setattr(fyyur.cache, 'hits', 0)
+    monkeypatch.setattr(fyyur.cache, 'misses', 0)
+    return fyyur.cache
+
+
+def test_listing_is_served_from_the_cache(client, memory_cache):
+    add_venue(1)
+    client.get('/api/v1/venues')
+    client.get('/api/v1/venues')
+    assert memory_cache.stats()['hits'] == 1
+    assert len(memory_cache.backend) == 1
+
+
+def test_clients_reading_from_the_primary_skip_the_cache(client, memory_cache, monkeypatch):
+    monkeypatch.setattr(fyyur, 'replica_engines', lambda engines: [fyyur.db.engine])
+    add_venue(1)
+    client.get('/api/v1/venues')
+    # the cached listing predates this venue
+    add_venue(2)
+    with client.session_transaction() as session:
+        session['primary_until'] = time.time() + 60
+    response = client.get('/api/v1/venues')
+    assert [venue['id'] for venue in response.get_json()['data']] == [1, 2]
+    assert memory_cache.stats()['hits'] == 0
+    # nor do they fill it
+    memory_cache.invalidate('venues')
+    client.get('/api/v1/venues')
+    assert len(memory_cache.backend) == 0
@@ -0,0 +1,21 @@
+import app as fyyur
+from conftest import add_venue, add_artist, add_shows
+
+
+def test_deleting_a_venue_changes_its_artists_etags_at_once(client, monkeypatch):
+    venue_id = add_venue(1)
+    artist_id = add_artist(1)
+    add_shows(venue_id, artist_id, 4)
+    response = client.get('/artists/%d' % artist_id)
+    etag = response.headers['ETag']
+    assert client.get('/artists/%d' % artist_id, headers={'If-None-Match': etag}).status_code == 304
+    # background jobs have not run yet
+    queued = []
+    monkeypatch.setattr(fyyur.jobs, 'enqueue', lambda name, *args, **options: queued.append(name))
+    assert client.delete('/venues/%d' % venue_id).status_code == 200
+    assert 'recount_show_counters' in queued
+    with client.session_transaction() as session:
+        session.pop('_flashes', None)
+    response = client.get('/artists/%d' % artist_id, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Venue 1' not in response.get_data(as_text=True)
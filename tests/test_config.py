@@ -0,0 +1,21 @@
+import os
+import runpy
+
+import pytest
+
+config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.py')
+
+
+def test_replicas_require_a_fixed_secret_key(monkeypatch):
+    monkeypatch.setenv('FYYUR_REPLICA_URLS', 'postgresql://replica/fyyur')
+    monkeypatch.delenv('FYYUR_SECRET_KEY', raising=False)
+    with pytest.raises(RuntimeError):
+        runpy.run_path(config_path)
+
+
+def test_secret_key_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('FYYUR_REPLICA_URLS', 'postgresql://replica/fyyur')
+    monkeypatch.setenv('FYYUR_SECRET_KEY', 'shared-key')
+    settings = runpy.run_path(config_path)
+    assert settings['SECRET_KEY'] == 'shared-key'
+    assert settings['SQLALCHEMY_BINDS'] == {'replica0': 'postgresql://replica/fyyur'}
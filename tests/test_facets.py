@@ -0,0 +1,26 @@
+from conftest import add_venue, add_artist
+
+
+def test_venues_filtered_by_genre(client):
+    add_venue(1, genres=['Jazz', 'Blues'])
+    add_venue(2, genres=['Rock'])
+    add_venue(3, genres=['Jazz'])
+    response = client.get('/api/v1/venues?genre=Jazz')
+    assert response.status_code == 200
+    assert [venue['id'] for venue in response.get_json()['data']] == [1, 3]
+    response = client.get('/api/v1/venues?genre=Jazz&genre=Blues')
+    assert [venue['id'] for venue in response.get_json()['data']] == [1]
+    response = client.get('/venues?genre=Rock')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    response.close()
+    assert 'Venue 2' in body and 'Venue 1' not in body
+
+
+def test_artists_filtered_by_genre(client):
+    add_artist(1, genres=['Rock'])
+    add_artist(2, genres=['Folk'])
+    response = client.get('/api/v1/artists?genre=Folk')
+    assert response.status_code == 200
+    assert [artist['id'] for artist in response.get_json()['data']] == [2]
+
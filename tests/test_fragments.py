@@ -0,0 +1,33 @@
+from fragments import FragmentCache
+from conftest import add_venue
+
+
+def test_entries_are_sized_in_encoded_bytes():
+    cache = FragmentCache(max_bytes=10)
+    cache.set('a', 'éééé')
+    assert cache.stats()['bytes'] == 8
+    cache.set('b', 'xx')
+    assert cache.get('a') == 'éééé'
+    # 'a' was read last, 'b' is evicted first
+    cache.set('c', 'xx')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'éééé' and cache.get('c') == 'xx'
+    assert cache.stats()['bytes'] == 10
+
+
+def test_replacing_an_entry_updates_the_size():
+    cache = FragmentCache(max_bytes=100)
+    cache.set('a', 'x' * 40)
+    cache.set('a', 'ü' * 10)
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 20
+
+
+def test_pages_render_with_the_cache_enabled(app, client):
+    assert app.jinja_env.fragment_cache is not None
+    venue_id = add_venue(1)
+    for attempt in range(2):
+        response = client.get('/venues/%d' % venue_id)
+        assert response.status_code == 200
+        assert 'Venue 1' in response.get_data(as_text=True)
+    assert app.jinja_env.fragment_cache.stats()['hits'] > 0
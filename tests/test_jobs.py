@@ -0,0 +1,24 @@
+import app as fyyur
+import jobs
+
+
+def test_waiting_unique_jobs_are_joined(tmp_path):
+    store = jobs.JobStore(str(tmp_path / 'jobs.sqlite'))
+    first = store.add('refresh_facet_views', ['Venue'], 5, delay=30, unique=True)
+    assert store.add('refresh_facet_views', ['Venue'], 5, delay=30, unique=True) == first
+    assert store.add('refresh_facet_views', ['Artist'], 5, delay=30, unique=True) != first
+    # not due yet
+    assert store.claim(600) is None
+    assert store.stats()['counts']['queued'] == 2
+
+
+def test_job_status_hides_arguments_and_errors(app, client, tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / 'jobs.sqlite'))
+    job_id = store.add('recount_show_counters', ['Artist', [1, 2]], 5)
+    store.fail(job_id, 'Traceback (most recent call last):\n  File "/srv/fyyur/app.py"')
+    monkeypatch.setattr(fyyur.jobs, 'store', store)
+    response = client.get('/__jobs/%d' % job_id)
+    assert response.status_code == 200
+    job = response.get_json()
+    assert job['status'] == 'failed' and job['name'] == 'recount_show_counters'
+    assert 'args' not in job and 'error' not in job
@@ -0,0 +1,40 @@
+from conftest import add_venue, add_artist, add_shows
+
+
+def page_queries(client, queries, url):
+    del queries[:]
+    response = client.get(url)
+    assert response.status_code == 200
+    # listings are streamed, their queries run while the body is read
+    response.get_data()
+    response.close()
+    return len(queries)
+
+
+def test_venues_listing_queries_do_not_grow_with_places(client, queries):
+    for number in range(3):
+        add_venue(number)
+    few = page_queries(client, queries, '/venues')
+    for number in range(3, 30):
+        add_venue(number)
+    assert page_queries(client, queries, '/venues') == few
+
+
+def test_venue_page_queries_do_not_grow_with_shows(client, queries):
+    venue_id = add_venue(1)
+    artist_ids = [add_artist(number) for number in range(5)]
+    add_shows(venue_id, artist_ids[0], 2)
+    few = page_queries(client, queries, '/venues/%d' % venue_id)
+    for artist_id in artist_ids:
+        add_shows(venue_id, artist_id, 20)
+    assert page_queries(client, queries, '/venues/%d' % venue_id) == few
+
+
+def test_artist_page_queries_do_not_grow_with_shows(client, queries):
+    artist_id = add_artist(1)
+    venue_ids = [add_venue(number) for number in range(5)]
+    add_shows(venue_ids[0], artist_id, 2)
+    few = page_queries(client, queries, '/artists/%d' % artist_id)
+    for venue_id in venue_ids:
+        add_shows(venue_id, artist_id, 20)
+    assert page_queries(client, queries, '/artists/%d' % artist_id) == few
@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine
+
+import app as fyyur
+import routing
+from app import db
+
+
+def test_one_replica_serves_the_whole_request(app, monkeypatch):
+    replicas = [create_engine('sqlite://'), create_engine('sqlite://')]
+    monkeypatch.setattr(routing, 'replica_engines', lambda engines: replicas)
+    picks = []
+    monkeypatch.setattr(routing.random, 'choice', lambda engines: picks.append(engines) or engines[len(picks) % 2])
+    with app.test_request_context('/venues/1'):
+        binds = {db.session.get_bind() for attempt in range(5)}
+    assert len(picks) == 1
+    assert len(binds) == 1 and binds <= set(replicas)
+
+
+def test_writes_and_other_methods_use_the_primary(app, monkeypatch):
+    monkeypatch.setattr(routing, 'replica_engines', lambda engines: [create_engine('sqlite://')])
+    with app.test_request_context('/venues/create', method='POST'):
+        assert db.session.get_bind() is db.engine
+
+
+def test_static_files_do_not_vary_on_the_cookie(client, monkeypatch):
+    monkeypatch.setattr(fyyur, 'replica_engines', lambda engines: [db.engine])
+    with client.session_transaction() as session:
+        session['primary_until'] = 0
+    response = client.get('/static/css/main.css?v=1')
+    assert response.status_code == 200
+    assert 'Cookie' not in response.vary
+    assert 'immutable' in response.headers['Cache-Control']
+    response.close()
+
+
+def test_without_replicas_reads_are_not_routed(app):
+    with app.test_request_context('/venues'):
+        app.preprocess_request()
+        assert 'primary_reads' not in fyyur.g
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import func
+
+from app import db, show, Venue, Artist
+from conftest import add_venue, add_artist
+
+
+@pytest.mark.parametrize('payload', ['[]', '[{"venue_id": 1}]', '"shows"', '3', 'null', 'not json',
+                                     '{"shows": {"venue_id": 1}}', '{"shows": "1,2"}'])
+def test_batch_rejects_malformed_payloads(client, payload):
+    response = client.post('/api/v1/shows/batch', data=payload, content_type='application/json')
+    assert response.status_code == 400
+    assert 'errors' in response.get_json()
+
+
+def test_batch_books_listed_shows(client):
+    venue_id = add_venue(1)
+    artist_id = add_artist(1)
+    response = client.post('/api/v1/shows/batch', json={'shows': [
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2031-01-03 20:00:00'},
+        {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2031-01-10 20:00:00'}]})
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()['count'] == 2
+    assert db.session.query(func.count(show.c.id)).scalar() == 2
+    assert db.session.get(Venue, venue_id).upcoming_shows_count == 2
+    assert db.session.get(Artist, artist_id).upcoming_shows_count == 2
+
+
+def test_batch_books_a_recurrence(client):
+    venue_id = add_venue(1)
+    artist_id = add_artist(1)
+    response = client.post('/api/v1/shows/batch', json={'venue_id': venue_id, 'artist_id': artist_id,
+        'start_time': '2031-01-03 20:00:00', 'rrule': 'FREQ=WEEKLY;COUNT=4'})
+    assert response.status_code == 201, response.get_json()
+    assert db.session.query(func.count(show.c.id)).filter(show.c.venue_id == venue_id).scalar() == 4
+    assert db.session.get(Venue, venue_id).upcoming_shows_count == 4
+    assert db.session.get(Artist, artist_id).upcoming_shows_count == 4
+
+
+@pytest.mark.parametrize('fields, key', [({'start_time': '3 Jan 2031', 'rrule': 'FREQ=WEEKLY;COUNT=4'}, 'start_time'),
+                                         ({'start_time': '2031-01-03 20:00:00', 'rrule': 'FREQ=SOMETIMES'}, 'rrule')])
+def test_recurrence_errors_name_their_field(client, fields, key):
+    response = client.post('/api/v1/shows/batch', json=dict(fields, venue_id=1, artist_id=1))
+    assert response.status_code == 400
+    assert list(response.get_json()['errors']) == [key]
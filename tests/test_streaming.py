@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import event
+
+from app import db
+from conftest import add_venue, add_artist, add_shows
+
+
+def read_streamed(client, url):
+    # the body is generated while it is read, after the request's teardown
+    response = client.get(url, buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    body = b''.join(response.response).decode()
+    response.close()
+    return body
+
+
+def next_page(body):
+    match = re.search(r'href="([^"]*after=[^"]*)"', body)
+    return match.group(1).replace('&amp;', '&') if match else None
+
+
+def test_streamed_shows_are_read_after_the_session_is_released(client):
+    venue_id = add_venue(1)
+    artist_id = add_artist(1)
+    add_shows(venue_id, artist_id, 10)
+    sessions = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "Show"' in statement:
+            sessions.append(db.session.registry.has())
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        body = read_streamed(client, '/shows?per_page=3')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    # the rows come from a connection opened while streaming,
+    # not from the session the teardown already removed
+    assert sessions == [False]
+    assert body.count('Artist 1') == 3
+    pages = 1
+    url = next_page(body)
+    while url:
+        body = read_streamed(client, url)
+        pages += 1
+        url = next_page(body)
+    # 5 upcoming shows, 3 per page
+    assert pages == 2
+    assert body.count('Artist 1') == 2
+    assert db.engine.pool.checkedout() == 0
+
+
+def test_streamed_venues_list_every_venue(client):
+    for number in range(5):
+        add_venue(number)
+    body = read_streamed(client, '/venues')
+    for number in range(5):
+        assert 'Venue %d' % number in body
+    assert db.engine.pool.checkedout() == 0
+
+
+def test_abandoned_stream_returns_its_connection(client):
+    for number in range(5):
+        add_venue(number)
+    response = client.get('/venues?per_page=2', buffered=False)
+    next(iter(response.response))
+    response.close()
+    assert db.engine.pool.checkedout() == 0